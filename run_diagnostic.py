@@ -3,11 +3,15 @@
 Run diagnostic upload to test connectivity and identify issues.
 """
 
+import importlib.util
 import sys
 import os
 
-# Add src to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+# Add src to path unless the modules are already importable (e.g. installed)
+if importlib.util.find_spec("btg_upload_module_diagnostic") is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from btg_upload_common import ensure_file
 
 def main():
     """Run diagnostic upload."""
@@ -21,13 +25,8 @@ def main():
     prefix = sys.argv[3]
     
     # Check if files exist
-    if not os.path.exists(token_file):
-        print(f"❌ Token file not found: {token_file}")
-        sys.exit(1)
-    
-    if not os.path.exists(file_path):
-        print(f"❌ File not found: {file_path}")
-        sys.exit(1)
+    ensure_file(token_file, "Token file")
+    ensure_file(file_path, "File")
     
     print("🔍 Running Diagnostic Upload Test")
     print("=" * 50)
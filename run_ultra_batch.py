@@ -3,30 +3,31 @@
 Run ultra-reliable batch upload with very long timeouts.
 """
 
+import importlib.util
 import sys
 import os
 
-# Add src to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+# Add src to path unless the modules are already importable (e.g. installed)
+if importlib.util.find_spec("btg_batch_module_simple") is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from btg_upload_common import ensure_file
 
 def main():
     """Run ultra-reliable batch upload."""
-    if len(sys.argv) != 3:
-        print("Usage: python run_ultra_batch.py <token_file> <csv_file>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python run_ultra_batch.py <token_file> <csv_file> [max_upload_workers]")
         print("Example: python run_ultra_batch.py token.txt data/samplesheet.csv")
         sys.exit(1)
     
     token_file = sys.argv[1]
     csv_file = sys.argv[2]
+    # Omitted, the batch core's default applies
+    upload_kwargs = {'max_upload_workers': int(sys.argv[3])} if len(sys.argv) > 3 else {}
     
     # Check if files exist
-    if not os.path.exists(token_file):
-        print(f"❌ Token file not found: {token_file}")
-        sys.exit(1)
-    
-    if not os.path.exists(csv_file):
-        print(f"❌ CSV file not found: {csv_file}")
-        sys.exit(1)
+    ensure_file(token_file, "Token file")
+    ensure_file(csv_file, "CSV file")
     
     print("🚀 Starting Ultra-Reliable Batch Upload")
     print("=" * 50)
@@ -34,15 +35,14 @@ def main():
     try:
         # Import and run the ultra batch module
         from btg_batch_module_simple import run_batch_full_simple_module
+        from btg_upload_module_ultra import upload_file_ultra
         
-        # Override the upload function to use ultra timeouts
-        import btg_upload_module_ultra
-        import btg_batch_module_simple
-        
-        # Replace the upload function in batch module
-        btg_batch_module_simple.upload_file_simple_batch = btg_upload_module_ultra.upload_file_ultra
+        def upload_ultra(file_path, token):
+            """Upload with ultra timeouts and return the remote path, as the batch expects."""
+            result = upload_file_ultra(file_path, token)
+            return result.get('upload_path') if result else None
         
-        run_batch_full_simple_module(token_file, csv_file)
+        run_batch_full_simple_module(token_file, csv_file, upload_fn=upload_ultra, **upload_kwargs)
     except ImportError as e:
         print(f"❌ Import error: {e}")
         print("Make sure you're running this from the project root directory")
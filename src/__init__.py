@@ -2,24 +2,50 @@
 BTG Virtual Geneticist API Client Package
 """
 
+import sys
+
 __version__ = "1.3.0"
 __author__ = "BT Genomics"
 __email__ = "support@btgenomics.com"
 
-# Import main modules for easy access
-from .btg_main import main
-from .btg_upload_module import upload_file, run_upload_module
-from .btg_task_module import create_task, run_create_task_module
-from .btg_status_module import check_status, run_status_check_module
-from .btg_batch_module import run_batch_full_module
+# Public name -> (submodule, attribute); submodules are imported on first access
+_LAZY = {
+    "main": (".btg_main", "main"),
+    "get_session": (".btg_http", "get_session"),
+    "upload_file": (".btg_upload_module", "upload_file"),
+    "run_upload_module": (".btg_upload_module", "run_upload_module"),
+    "create_task": (".btg_task_module", "create_task"),
+    "run_create_task_module": (".btg_task_module", "run_create_task_module"),
+    "check_status": (".btg_status_module", "check_task_status"),
+    "run_status_check_module": (".btg_status_module", "run_status_check_module"),
+    "run_batch_full_module": (".btg_batch_module", "run_batch_full_module"),
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        """Import the submodule behind a public name on first use (PEP 562)."""
+        target = _LAZY.get(name)
+        if target is None:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        import importlib
+        module = importlib.import_module(target[0], __name__)
+        value = getattr(module, target[1])
+        globals()[name] = value
+        return value
+else:
+    # Module-level __getattr__ needs Python 3.7+; import everything up front
+    import importlib
+    for _name, (_module, _attr) in _LAZY.items():
+        globals()[_name] = getattr(importlib.import_module(_module, __name__), _attr)
 
 __all__ = [
     "main",
+    "get_session",
     "upload_file",
     "run_upload_module",
-    "create_task", 
+    "create_task",
     "run_create_task_module",
     "check_status",
     "run_status_check_module",
     "run_batch_full_module"
-] 
\ No newline at end of file
+]
@@ -0,0 +1,580 @@
+"""
+Virtual Geneticist API - Shared Batch Core
+CSV loading, results files, upload gating and the upload and task-creation pipeline shared by the batch modules.
+"""
+
+import csv
+import itertools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from btg_http import (
+    UPLOAD_READ_BUFFER,
+    auth_headers,
+    json_dumps,
+    json_headers,
+    json_loads,
+    read_token_from_file,
+    throttled_post,
+)
+from btg_log import get_logger, queued_logging
+
+# === CONFIGURATION ===
+BASE_URL = "https://vg-api.btgenomics.com:8082/api"
+UPLOAD_URL = f"{BASE_URL}/upload"
+CREATE_TASK_URL = f"{BASE_URL}/createtask"
+
+# Upload results written to the working directory; re-runs skip files listed here
+UPLOAD_RESULTS_FILE = "upload_results.json"
+
+# Tasks created by earlier runs; titles listed here are not submitted again
+TASK_RESULTS_FILE = "task_results.json"
+
+# Append-only journal of uploads finished during a run, folded into UPLOAD_RESULTS_FILE at the end
+UPLOAD_JOURNAL_FILE = "upload_results.jsonl"
+
+# Read buffer for the sample CSV; large reads keep cold-cache manifests fast
+CSV_READ_BUFFER = 1 << 23
+
+# Number of files uploaded concurrently during a batch run
+MAX_UPLOAD_WORKERS = 8
+
+# Number of task creation requests in flight during a batch run
+MAX_TASK_WORKERS = 8
+
+# Progress output goes through one logger so worker threads never write to stdout directly
+logger = get_logger("btg.batch.core")
+
+def iter_csv_rows(csv_file_path: str) -> Iterator[Dict[str, str]]:
+    """Yield the CSV rows one at a time without loading the whole file."""
+    try:
+        with open(csv_file_path, 'r', encoding='utf-8', newline='', buffering=CSV_READ_BUFFER) as f:
+            yield from csv.DictReader(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
+    except Exception as e:
+        raise Exception(f"Error reading CSV file: {e}")
+
+def read_csv_file(csv_file_path: str) -> List[Dict[str, str]]:
+    """Read and parse the CSV file."""
+    return list(iter_csv_rows(csv_file_path))
+
+REQUIRED_COLUMNS = frozenset(['samples', 'title', 'project', 'vcf_mode', 'assembly', 'upload_vcf'])
+
+def validate_csv_structure(data: List[Dict[str, str]]) -> List[str]:
+    """Validate that the CSV has the required columns."""
+    errors = []
+    
+    if not data:
+        errors.append("CSV file is empty")
+        return errors
+    
+    # One set difference against the header instead of a lookup per column
+    missing = REQUIRED_COLUMNS - data[0].keys()
+    errors.extend(f"Missing required column: {column}" for column in sorted(missing))
+    
+    return errors
+
+# Cell values that mean "no file" in the parent columns
+NA_VALUES = frozenset(['', 'NA', 'N/A', 'None', 'null'])
+
+def normalize_vcf_mode(vcf_mode: Optional[str]) -> Optional[str]:
+    """Strip and upper-case a vcf_mode cell so ' trio' and 'TRIO' plan the same."""
+    return sys.intern(vcf_mode.strip().upper()) if vcf_mode else vcf_mode
+
+def optional_path(value: Optional[str]) -> Optional[str]:
+    """Treat empty cells and NA markers as no file."""
+    return None if value is None or value in NA_VALUES else value
+
+def upload_fingerprint(file_path: str) -> str:
+    """Identify a local file by path, size and modification time."""
+    stat = os.stat(file_path)
+    return f"{file_path}:{stat.st_size}:{int(stat.st_mtime)}"
+
+def load_upload_results(results_path: str = UPLOAD_RESULTS_FILE,
+                        journal_path: str = UPLOAD_JOURNAL_FILE) -> Dict[str, str]:
+    """Load the fingerprint -> remote path map from previous runs, if any.
+    
+    Entries journaled by an interrupted run are replayed on top of the
+    consolidated results file.
+    """
+    results = {}
+    if os.path.exists(results_path):
+        try:
+            with open(results_path, 'rb') as f:
+                loaded = json_loads(f.read())
+            if isinstance(loaded, dict):
+                results.update(loaded)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable {results_path}: {e}")
+    
+    if os.path.exists(journal_path):
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    results.update(json_loads(line))
+                except ValueError:
+                    # A crash can leave the last line half-written
+                    continue
+    
+    return results
+
+def _write_json_atomic(obj, path: str):
+    """Write a results file atomically so a crash never leaves a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(json_dumps(obj, indent=True))
+    os.replace(tmp_path, path)
+
+def save_upload_results(results: Dict[str, str], results_path: str = UPLOAD_RESULTS_FILE):
+    """Write the fingerprint -> remote path map."""
+    _write_json_atomic(results, results_path)
+
+def load_task_results(results_path: str = TASK_RESULTS_FILE) -> Dict[str, Dict[str, str]]:
+    """Index tasks recorded by previous runs by title."""
+    if not os.path.exists(results_path):
+        return {}
+    try:
+        with open(results_path, 'rb') as f:
+            prior = json_loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Ignoring unreadable {results_path}: {e}")
+        return {}
+    if not isinstance(prior, list):
+        return {}
+    return {task['title']: task for task in prior if task.get('title') and task.get('submission_id')}
+
+def save_task_results(tasks: Dict[str, Dict[str, str]], results_path: str = TASK_RESULTS_FILE):
+    """Write every known task as the documented list of task records."""
+    _write_json_atomic(list(tasks.values()), results_path)
+
+def record_upload(journal, fingerprint: str, remote_path: str):
+    """Append one finished upload to the journal and force it to disk."""
+    journal.write(json_dumps({fingerprint: remote_path}) + b"\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+# Task config fields that hold a local file path to be replaced by its remote path
+UPLOAD_FIELDS = ('upload_vcf', 'upload_father', 'upload_mother')
+
+# Parent fields each vcf_mode sends alongside upload_vcf; modes not listed send none
+PARENT_FIELDS = {'TRIO': ('upload_father', 'upload_mother')}
+
+class UploadGate:
+    """Hold task configs until every local file they list has an upload outcome.
+    
+    settle() is called once per path as its upload finishes (remote path) or
+    fails (None); it remaps the waiting configs and returns those that have
+    no files left outstanding, paired with the paths that failed for them.
+    Not thread-safe: drive it from the thread that collects upload results.
+    """
+    
+    def __init__(self):
+        self._waiting = {}
+        self._pending = {}
+        self._missing = {}
+    
+    def hold(self, config: Dict[str, str]):
+        """Register a task config against the local files it still needs."""
+        paths = {config[field] for field in UPLOAD_FIELDS if config.get(field) is not None}
+        key = id(config)
+        self._pending[key] = len(paths)
+        self._missing[key] = []
+        for path in paths:
+            self._waiting.setdefault(path, []).append(config)
+    
+    def settle(self, file_path: str, remote_path: Optional[str]) -> List[Tuple[Dict[str, str], List[str]]]:
+        """Record one upload outcome and return the configs it releases."""
+        released = []
+        for config in self._waiting.pop(file_path, ()):
+            key = id(config)
+            if remote_path is None:
+                self._missing[key].append(file_path)
+            else:
+                for field in UPLOAD_FIELDS:
+                    if config.get(field) == file_path:
+                        config[field] = remote_path
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                released.append((config, self._missing.pop(key)))
+        return released
+
+def upload_file_basic(file_path: str, token: str, prefix: str = None,
+                      timeout: Optional[Tuple[int, int]] = None) -> Optional[str]:
+    """Stream one file to the upload endpoint and return its remote path.
+    
+    Used when a variant's dedicated upload module cannot be imported;
+    timeout=None sends the request without a timeout.
+    """
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+    
+    fields = {}
+    if prefix:
+        fields['prefix'] = prefix
+    
+    try:
+        logger.info(f"📤 Uploading {file_path}...")
+        with open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER) as f:
+            # Stream the multipart body from disk instead of building it in memory
+            fields['file'] = (os.path.basename(file_path), f, 'application/octet-stream')
+            encoder = MultipartEncoder(fields=fields)
+            headers = {**auth_headers(token), 'Content-Type': encoder.content_type}
+            
+            response = throttled_post(UPLOAD_URL, headers=headers, data=encoder, timeout=timeout)
+        
+        # Parse the body once; non-JSON bodies fall back to the raw text
+        try:
+            payload = json_loads(response.content)
+        except ValueError:
+            payload = None
+        
+        if response.status_code == 200 and isinstance(payload, dict):
+            remote_path = payload.get('upload_path')
+            logger.info(f"✅ Upload successful: {remote_path}")
+            return remote_path
+        else:
+            logger.error(f"❌ Upload failed for {file_path}: {response.status_code}")
+            if isinstance(payload, dict):
+                logger.info(f"Error message: {payload.get('message', 'Unknown error')}")
+            else:
+                logger.info(f"Response text: {response.text}")
+            return None
+            
+    except Exception as e:
+        logger.error(f"❌ Error uploading {file_path}: {e}")
+        return None
+
+def build_task_config(row: Dict[str, str], title: str) -> Dict[str, str]:
+    """Create the task config for a single sample row under the given title; NA paths become None."""
+    # One interned copy of the mode serves the config and the parent lookup
+    mode = normalize_vcf_mode(row['vcf_mode'])
+    task_config = {
+        'title': title,
+        'project': row['project'],
+        'vcf_mode': mode,
+        'assembly': row['assembly'],
+        'upload_vcf': optional_path(row['upload_vcf']),
+        'clinical_info': row.get('clinical_info', '')
+    }
+    
+    # Add the parent files the mode sends, e.g. father and mother for TRIO (skip if NA)
+    for field in PARENT_FIELDS.get(mode, ()):
+        file_path = optional_path(row.get(field))
+        if file_path:
+            task_config[field] = file_path
+    
+    return task_config
+
+def process_samples_individual(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Process each sample row individually for task creation."""
+    # Add timestamp to make titles unique
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    
+    return [build_task_config(row, f"{row['title']}_{timestamp}") for row in data]
+
+def create_task_request(config: Dict[str, str], token: str,
+                        timeout: Optional[Tuple[int, int]] = None) -> Optional[str]:
+    """Create a task and return the submission ID; timeout=None waits indefinitely."""
+    
+    headers = json_headers(token)
+    
+    # Remove None values from config
+    task_data = {k: v for k, v in config.items() if v is not None}
+    
+    try:
+        logger.info(f"🔬 Creating task for: {task_data['title']}")
+        logger.info(f"Mode: {task_data['vcf_mode']}")
+        logger.info(f"Assembly: {task_data['assembly']}")
+        
+        response = throttled_post(CREATE_TASK_URL, headers=headers, data=json_dumps(task_data), timeout=timeout)
+        
+        # Parse the body once; non-JSON bodies fall back to the raw text
+        try:
+            payload = json_loads(response.content)
+        except ValueError:
+            payload = None
+        
+        if response.status_code == 200 and isinstance(payload, dict):
+            submission_id = payload.get('submission_id')
+            logger.info(f"✅ Task created successfully: {submission_id}")
+            return submission_id
+        else:
+            logger.error(f"❌ Task creation failed: {response.status_code}")
+            if isinstance(payload, dict):
+                error_msg = str(payload.get('message', 'Unknown error'))
+                logger.info(f"Error message: {error_msg}")
+                
+                # Handle duplicate submission error
+                if "already been submitted" in error_msg:
+                    logger.info(f"💡 This task has already been submitted. The API prevents duplicate submissions.")
+                    logger.info(f"💡 Try using different titles or check if the task already exists.")
+            else:
+                logger.info(f"Response text: {response.text}")
+            return None
+            
+    except Exception as e:
+        logger.error(f"❌ Error creating task: {e}")
+        return None
+
+def run_batch(token_file_path: str, csv_file_path: str,
+              upload_fn: Callable[[str, str], Optional[str]],
+              create_fn: Callable[[Dict[str, str], str], Optional[str]],
+              banner: Sequence[str], max_upload_workers: int = MAX_UPLOAD_WORKERS,
+              validate_row: Optional[Callable[[Dict[str, str], int], List[str]]] = None,
+              skip_submitted: bool = False):
+    """Run a batch (upload + task creation) for one client variant.
+    
+    upload_fn(file_path, token) uploads one file and returns its remote path or None;
+    create_fn(config, token) creates one task and returns its submission ID or None.
+    banner is the variant's title line followed by any notes printed under it.
+    max_upload_workers caps how many files are uploaded at the same time.
+    validate_row(row, row_number) returns a row's errors; any error stops the batch
+    before the first upload. skip_submitted keeps titles as written in the CSV, skips
+    those already recorded in TASK_RESULTS_FILE and records new submissions there;
+    otherwise every title gets the run's timestamp so the API accepts it again.
+    """
+    with queued_logging(logger):
+        _run_batch(token_file_path, csv_file_path, upload_fn, create_fn, banner,
+                   max_upload_workers, validate_row, skip_submitted)
+
+def _run_batch(token_file_path: str, csv_file_path: str,
+               upload_fn: Callable[[str, str], Optional[str]],
+               create_fn: Callable[[Dict[str, str], str], Optional[str]],
+               banner: Sequence[str], max_upload_workers: int,
+               validate_row: Optional[Callable[[Dict[str, str], int], List[str]]],
+               skip_submitted: bool):
+    logger.info("\n" + "="*60)
+    logger.info(banner[0])
+    logger.info("="*60)
+    logger.info("This will upload all files and create tasks in one operation")
+    for note in banner[1:]:
+        logger.info(note)
+    logger.info("="*60)
+    
+    try:
+        # Load token
+        token = read_token_from_file(token_file_path)
+        logger.info(f"✅ Token loaded from: {token_file_path}")
+        
+        # Stream the CSV, validating the columns on the first row
+        rows = iter_csv_rows(csv_file_path)
+        first_row = next(rows, None)
+        
+        # Validate CSV structure
+        errors = validate_csv_structure([first_row] if first_row else [])
+        if errors:
+            logger.error("❌ CSV validation errors:")
+            logger.info("\n".join(f"  - {error}" for error in errors))
+            return
+        
+        uploaded_files = {}
+        failed_uploads = []
+        
+        created_tasks = []  # (title, submission_id) pairs for the summary
+        failed_tasks = []
+        
+        # A re-run skips files whose path, size and mtime were already uploaded
+        # instead of sending them again
+        upload_results = load_upload_results()
+        
+        # Titles submitted by earlier runs would only be rejected as duplicates
+        submitted = load_task_results() if skip_submitted else {}
+        known_tasks = len(submitted)
+        
+        # One pass over the rows validates them and builds the task configs and the
+        # unique upload paths; each path is uploaded once, even when rows share a parent VCF
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+        processed_samples = []
+        unfiled_samples = []
+        upload_jobs = []
+        queued_paths = set()
+        gate = UploadGate()
+        for i, row in enumerate(itertools.chain([first_row], rows), 1):
+            if validate_row:
+                # Rows are numbered as in a spreadsheet, with the header on line 1
+                errors.extend(validate_row(row, i + 1))
+                if errors:
+                    continue
+            
+            # Add timestamp to make titles unique, unless they are tracked across runs
+            title = row['title'] if skip_submitted else f"{row['title']}_{timestamp}"
+            sample_config = build_task_config(row, title)
+            processed_samples.append(sample_config)
+            
+            # Get file path
+            file_path = sample_config['upload_vcf']
+            if not file_path:
+                logger.warning(f"⚠️  Skipping row {i}: No file path provided")
+                unfiled_samples.append(sample_config)
+                continue
+            
+            previous = submitted.get(title)
+            if previous:
+                created_tasks.append((previous['title'], previous['submission_id']))
+                logger.info(f"⏭️  Task already submitted: {previous['title']} ({previous['submission_id']})")
+            else:
+                # The task is released to the task pool once every file it lists has an outcome
+                gate.hold(sample_config)
+            
+            # build_task_config only keeps the parents the mode sends and that are set
+            row_paths = [sample_config[field] for field in UPLOAD_FIELDS if field in sample_config]
+            
+            for file_path in row_paths:
+                if file_path in queued_paths:
+                    continue
+                queued_paths.add(file_path)
+                
+                # One stat per path: it is both the existence check and the results key
+                try:
+                    fingerprint = upload_fingerprint(file_path)
+                except OSError:
+                    logger.error(f"❌ File not found: {file_path}")
+                    failed_uploads.append(file_path)
+                    continue
+                
+                remote_path = upload_results.get(fingerprint)
+                if remote_path:
+                    uploaded_files[file_path] = remote_path
+                    logger.info(f"⏭️  Already uploaded: {os.path.basename(file_path)}")
+                    continue
+                
+                upload_jobs.append((file_path, fingerprint))
+        
+        if errors:
+            logger.error("❌ CSV validation errors:")
+            logger.info("\n".join(f"  - {error}" for error in errors))
+            return
+        
+        logger.info(f"✅ CSV loaded from: {csv_file_path}")
+        logger.info(f"📊 Found {len(processed_samples)} rows")
+        
+        logger.info("")
+        
+        # Step 1: Upload all files
+        logger.info("📤 BATCH UPLOAD MODULE")
+        logger.info("="*60)
+        
+        # Each task is created as soon as its own files are uploaded, while other uploads continue
+        with ThreadPoolExecutor(max_workers=MAX_TASK_WORKERS) as task_executor:
+            task_futures = {}
+            
+            def submit_task(sample_config: Dict[str, str]):
+                future = task_executor.submit(create_fn, sample_config, token)
+                task_futures[future] = sample_config
+            
+            def release(file_path: str, remote_path: Optional[str]):
+                # Every file a task lists must be uploaded before it is submitted
+                for sample_config, missing in gate.settle(file_path, remote_path):
+                    if missing:
+                        failed_tasks.append(sample_config['title'])
+                        logger.error(f"❌ Skipping task {sample_config['title']}: files not uploaded: {', '.join(missing)}")
+                    else:
+                        submit_task(sample_config)
+            
+            for file_path, remote_path in list(uploaded_files.items()):
+                release(file_path, remote_path)
+            for file_path in failed_uploads:
+                release(file_path, None)
+            
+            # Upload files concurrently; each worker streams one file over the shared session
+            if upload_jobs:
+                with open(UPLOAD_JOURNAL_FILE, 'ab') as journal, \
+                        ThreadPoolExecutor(max_workers=max(1, min(max_upload_workers, len(upload_jobs)))) as executor:
+                    futures = {
+                        executor.submit(upload_fn, file_path, token): (file_path, fingerprint)
+                        for file_path, fingerprint in upload_jobs
+                    }
+                    
+                    for done, future in enumerate(as_completed(futures), 1):
+                        file_path, fingerprint = futures[future]
+                        try:
+                            remote_path = future.result()
+                        except Exception as e:
+                            logger.error(f"❌ Error uploading {file_path}: {e}")
+                            remote_path = None
+                        
+                        if remote_path:
+                            uploaded_files[file_path] = remote_path
+                            # Journal every upload so an interrupted run can resume
+                            upload_results[fingerprint] = remote_path
+                            record_upload(journal, fingerprint, remote_path)
+                            logger.info(f"✅ [{done}/{len(futures)}] Uploaded: {os.path.basename(file_path)}")
+                        else:
+                            failed_uploads.append(file_path)
+                            logger.error(f"❌ [{done}/{len(futures)}] Failed to upload: {file_path}")
+                        release(file_path, remote_path)
+            
+            # Fold the journal into the consolidated results file, including entries
+            # replayed from an interrupted run when nothing had to be uploaded now;
+            # an empty journal (every upload failed) means the file is already current
+            if os.path.exists(UPLOAD_JOURNAL_FILE):
+                if os.path.getsize(UPLOAD_JOURNAL_FILE):
+                    save_upload_results(upload_results)
+                os.remove(UPLOAD_JOURNAL_FILE)
+            
+            # Report upload results
+            logger.info(f"\n📊 Upload Summary:")
+            logger.info(f"✅ Successful: {len(uploaded_files)}")
+            logger.info(f"❌ Failed: {len(failed_uploads)}")
+            
+            if failed_uploads:
+                logger.error(f"\n❌ Failed uploads:")
+                logger.info("\n".join(f"  - {file_path}" for file_path in failed_uploads))
+            
+            if not uploaded_files:
+                logger.error("❌ No files were uploaded successfully. Cannot proceed with task creation.")
+                return
+            
+            # Rows without a file of their own were never held back by an upload
+            for sample_config in unfiled_samples:
+                submit_task(sample_config)
+            
+            # Step 2: Collect the tasks submitted while uploads were running
+            logger.info(f"\n🔬 BATCH TASK CREATION MODULE")
+            logger.info("="*60)
+            
+            for done, future in enumerate(as_completed(task_futures), 1):
+                sample_config = task_futures[future]
+                submission_id = future.result()
+                
+                if submission_id:
+                    created_tasks.append((sample_config['title'], submission_id))
+                    if skip_submitted:
+                        submitted[sample_config['title']] = {
+                            'title': sample_config['title'],
+                            'submission_id': submission_id,
+                            'vcf_mode': sample_config['vcf_mode']
+                        }
+                    logger.info(f"✅ [{done}/{len(task_futures)}] Task created: {sample_config['title']}")
+                else:
+                    failed_tasks.append(sample_config['title'])
+                    logger.error(f"❌ [{done}/{len(task_futures)}] Failed to create task: {sample_config['title']}")
+        
+        # Rewrite the task results only when this run submitted something new
+        if len(submitted) != known_tasks:
+            save_task_results(submitted)
+        
+        # Final summary
+        logger.info(f"\n🎉 BATCH PROCESSING COMPLETE")
+        logger.info("="*60)
+        logger.info(f"📤 Files uploaded: {len(uploaded_files)}/{len(queued_paths)}")
+        logger.info(f"🔬 Tasks created: {len(created_tasks)}/{len(processed_samples)}")
+        
+        if created_tasks:
+            logger.info(f"\n✅ Successfully created tasks:")
+            # Each list goes out as one log record, however many samples the batch has
+            logger.info("\n".join(f"  - {title}: {submission_id}" for title, submission_id in created_tasks))
+        
+        if failed_tasks:
+            logger.error(f"\n❌ Failed task creations:")
+            logger.info("\n".join(f"  - {title}" for title in failed_tasks))
+        
+        if failed_uploads:
+            logger.warning(f"\n⚠️  Note: {len(failed_uploads)} files failed to upload and were skipped")
+        
+    except Exception as e:
+        logger.exception(f"❌ Error in batch processing: {e}")
@@ -1,68 +1,83 @@
 """
 Virtual Geneticist API - Batch Processing Module (v1.0.0 style)
-Uses simple upload without timeouts or retry logic for all required files.
+Uploads each required file in a single attempt without a request timeout; failed connections are
+retried, and task creation is throttled and retried on 429/503.
 """
 
-import csv
 import os
-import json
-import requests
-import time
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional
+import sys
+from typing import Dict, List, NamedTuple, Tuple, Optional
+
+from btg_batch_core import (
+    MAX_UPLOAD_WORKERS,
+    PARENT_FIELDS,
+    logger,
+    normalize_vcf_mode,
+    optional_path,
+    read_csv_file,  # re-exported: callers still import it from this module
+    run_batch,
+    upload_file_basic,
+)
+from btg_http import (
+    json_dumps,
+    json_headers,
+    json_loads,
+    throttled_post,
+)
 
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 UPLOAD_URL = f"{BASE_URL}/upload"
 CREATE_TASK_URL = f"{BASE_URL}/createtask"
 
-def read_token_from_file(token_file_path: str) -> str:
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
+REQUIRED_COLUMNS = ('samples', 'title', 'project', 'vcf_mode', 'assembly', 'upload_vcf')
+VALID_VCF_MODES = frozenset(['TRIO', 'SNP'])
 
-def read_csv_file(csv_file_path: str) -> List[Dict[str, str]]:
-    """Read and parse the CSV file."""
-    try:
-        with open(csv_file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading CSV file: {e}")
+def validate_csv_columns(first_row: Dict[str, str]) -> List[str]:
+    """Report every required column missing from the CSV header at once."""
+    missing = sorted(set(REQUIRED_COLUMNS) - first_row.keys())
+    return [f"Missing required column: {column}" for column in missing]
+
+def validate_csv_row(row: Dict[str, str], row_number: int) -> List[str]:
+    """Check one row's values so all problems surface before any upload."""
+    errors = []
+    
+    vcf_mode = row.get('vcf_mode')
+    if normalize_vcf_mode(vcf_mode) not in VALID_VCF_MODES:
+        errors.append(f"Row {row_number}: invalid vcf_mode '{vcf_mode}' (expected TRIO or SNP)")
+    
+    upload_vcf = row.get('upload_vcf')
+    if not upload_vcf:
+        errors.append(f"Row {row_number}: upload_vcf is empty")
+    elif not os.path.isfile(upload_vcf):
+        errors.append(f"Row {row_number}: VCF file not found: {upload_vcf}")
+    
+    return errors
 
 def validate_csv_structure(data: List[Dict[str, str]]) -> List[str]:
-    """Validate that the CSV has the required columns."""
+    """Validate that the CSV has the required columns and usable rows."""
     errors = []
     
     if not data:
         errors.append("CSV file is empty")
         return errors
     
-    required_columns = ['samples', 'title', 'project', 'vcf_mode', 'assembly', 'upload_vcf']
-    first_row = data[0]
+    errors.extend(validate_csv_columns(data[0]))
+    if errors:
+        return errors
     
-    for column in required_columns:
-        if column not in first_row:
-            errors.append(f"Missing required column: {column}")
+    # Rows are numbered as in a spreadsheet, with the header on line 1
+    for row_number, row in enumerate(data, 2):
+        errors.extend(validate_csv_row(row, row_number))
     
     return errors
 
 def upload_file_batch(file_path: str, token: str, prefix: str = None) -> Optional[str]:
-    """Upload a file using v1.0.0 style - simple, no timeouts, no retries."""
+    """Upload a file using v1.0.0 style - one attempt, no request timeout.
     
-    if not os.path.exists(file_path):
-        print(f"❌ File not found: {file_path}")
-        return None
+    The shared session retries failed connections, and UPLOAD_BREAKER skips
+    the upload while the server keeps failing.
+    """
     
     # Import the v1.0.0 style upload function
     try:
@@ -71,245 +86,140 @@ def upload_file_batch(file_path: str, token: str, prefix: str = None) -> Optiona
         if result:
             return result.get('upload_path')
         return None
+    except FileNotFoundError:
+        # Opening the file is the existence check; no separate stat beforehand
+        logger.error(f"❌ File not found: {file_path}")
+        return None
     except ImportError:
         # Fallback to basic upload if import fails
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
-        
-        files = {
-            'file': open(file_path, 'rb')
+        return upload_file_basic(file_path, token, prefix)
+
+class BatchItem(NamedTuple):
+    """One CSV row resolved into the fields both batch phases need."""
+    title: str
+    project: str
+    mode: str
+    assembly: str
+    clinical: str
+    proband: str
+    father: Optional[str]
+    mother: Optional[str]
+    
+    def upload_files(self) -> List[Tuple[str, str]]:
+        """Return the (file_type, file_path) uploads this sample requires."""
+        files = [('main', self.proband)] if self.proband else []
+        if self.father:
+            files.append(('father', self.father))
+        if self.mother:
+            files.append(('mother', self.mother))
+        return files
+    
+    def task_config(self) -> Dict[str, str]:
+        """Build the create-task config, leaving out parents that are not set."""
+        task_config = {
+            'title': self.title,
+            'project': self.project,
+            'vcf_mode': self.mode,
+            'assembly': self.assembly,
+            'upload_vcf': self.proband,
+            'clinical_info': self.clinical
         }
-        
-        data = {}
-        if prefix:
-            data['prefix'] = prefix
-        
-        try:
-            print(f"📤 Uploading {file_path}...")
-            # Simple request - NO TIMEOUTS SPECIFIED (like v1.0.0)
-            response = requests.post(UPLOAD_URL, headers=headers, files=files, data=data)
-            
-            files['file'].close()
-            
-            if response.status_code == 200:
-                result = response.json()
-                remote_path = result.get('upload_path')
-                print(f"✅ Upload successful: {remote_path}")
-                return remote_path
-            else:
-                print(f"❌ Upload failed for {file_path}: {response.status_code}")
-                try:
-                    error_msg = response.json().get('message', 'Unknown error')
-                    print(f"Error message: {error_msg}")
-                except:
-                    print(f"Response text: {response.text}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error uploading {file_path}: {e}")
-            return None
+        if self.father:
+            task_config['upload_father'] = self.father
+        if self.mother:
+            task_config['upload_mother'] = self.mother
+        return task_config
+
+def plan_batch_item(row: Dict[str, str]) -> BatchItem:
+    """Resolve a CSV row into a BatchItem; parents only count in modes that send them."""
+    mode = normalize_vcf_mode(row['vcf_mode'])
+    # Same per-mode table btg_batch_core builds its task configs from
+    parent_fields = PARENT_FIELDS.get(mode, ())
+    # Project, mode and assembly repeat on nearly every row; keep one copy of each
+    return BatchItem(
+        title=row['title'],
+        project=sys.intern(row['project']),
+        mode=mode,
+        assembly=sys.intern(row['assembly']),
+        clinical=row.get('clinical_info', ''),
+        proband=optional_path(row['upload_vcf']),
+        father=optional_path(row.get('upload_father')) if 'upload_father' in parent_fields else None,
+        mother=optional_path(row.get('upload_mother')) if 'upload_mother' in parent_fields else None
+    )
+
+def plan_batch(data: List[Dict[str, str]]) -> List[BatchItem]:
+    """Resolve every CSV row once; the plan feeds both uploads and task creation."""
+    return [plan_batch_item(row) for row in data]
+
+def collect_upload_jobs(items: List[BatchItem]) -> List[Tuple[str, str]]:
+    """Build the flat list of (file_type, file_path) uploads required by the plan."""
+    return [job for item in items for job in item.upload_files()]
+
+def batch_task_configs(items: List[BatchItem]) -> List[Dict[str, str]]:
+    """Build one create-task config per planned sample."""
+    return [item.task_config() for item in items]
 
 def process_samples_individual(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """Process each sample row individually for task creation."""
-    processed_samples = []
+    return batch_task_configs(plan_batch(data))
+
+def create_task_batch(config: Dict[str, str], token: str) -> Optional[str]:
+    """Create a task and return the submission ID."""
     
-    for i, row in enumerate(data):
-        # Create a task config for this sample
-        task_config = {
-            'title': row['title'],
-            'project': row['project'],
-            'vcf_mode': row['vcf_mode'],
-            'assembly': row['assembly'],
-            'upload_vcf': row['upload_vcf'],
-            'clinical_info': row.get('clinical_info', '')
-        }
-        
-        # Add father and mother files for TRIO mode (skip if NA)
-        if row['vcf_mode'] == 'TRIO':
-            if row.get('upload_father') and row['upload_father'] != 'NA':
-                task_config['upload_father'] = row['upload_father']
-            if row.get('upload_mother') and row['upload_mother'] != 'NA':
-                task_config['upload_mother'] = row['upload_mother']
-        
-        processed_samples.append(task_config)
+    headers = json_headers(token)
     
-    return processed_samples
-
-def run_batch_full_module(token_file_path: str, csv_file_path: str):
-    """Run the v1.0.0 style batch full module (upload + task creation)."""
-    print("\n" + "="*60)
-    print("🚀 BATCH PROCESSING MODULE (v1.0.0 style)")
-    print("="*60)
-    print("This will upload all files and create tasks in one operation")
-    print("Using simple upload - no timeouts, no retries (like v1.0.0)")
-    print("="*60)
+    # Validated rows never leave a None path in the config, so it is sent as-is
+    task_data = config
     
     try:
-        # Load token
-        token = read_token_from_file(token_file_path)
-        print(f"✅ Token loaded from: {token_file_path}")
-        
-        # Load CSV
-        data = read_csv_file(csv_file_path)
-        print(f"✅ CSV loaded from: {csv_file_path}")
-        print(f"📊 Found {len(data)} rows")
+        logger.info(f"🔬 Creating task for: {task_data['title']}")
+        logger.info(f"Mode: {task_data['vcf_mode']}")
+        logger.info(f"Assembly: {task_data['assembly']}")
         
-        # Validate CSV structure
-        errors = validate_csv_structure(data)
-        if errors:
-            print("❌ CSV validation errors:")
-            for error in errors:
-                print(f"  - {error}")
-            return
+        response = throttled_post(CREATE_TASK_URL, headers=headers, data=json_dumps(task_data))
         
-        print()
-        
-        # Step 1: Upload all files
-        print("📤 BATCH UPLOAD MODULE")
-        print("="*60)
-        
-        uploaded_files = {}
-        failed_uploads = []
-        
-        for i, row in enumerate(data, 1):
-            print(f"\n📁 Processing row {i}/{len(data)}")
-            
-            # Get all files for this sample
-            files_to_upload = []
-            
-            # Main VCF file
-            main_file = row['upload_vcf']
-            if main_file and main_file != 'NA':
-                files_to_upload.append(('main', main_file))
-            
-            # Father file for TRIO mode
-            if row['vcf_mode'] == 'TRIO':
-                father_file = row.get('upload_father')
-                if father_file and father_file != 'NA':
-                    files_to_upload.append(('father', father_file))
-                
-                mother_file = row.get('upload_mother')
-                if mother_file and mother_file != 'NA':
-                    files_to_upload.append(('mother', mother_file))
-            
-            # Upload all files for this sample
-            for file_type, file_path in files_to_upload:
-                print(f"📤 Uploading {file_type} file: {os.path.basename(file_path)}")
-                
-                # Check if file exists
-                if not os.path.exists(file_path):
-                    print(f"❌ File not found: {file_path}")
-                    failed_uploads.append(file_path)
-                    continue
-                
-                # Upload file using v1.0.0 style
-                remote_path = upload_file_batch(file_path, token)
+        # Parse the body once; non-JSON bodies fall back to the raw text
+        try:
+            payload = json_loads(response.content)
+        except ValueError:
+            payload = None
+        
+        if response.status_code == 200 and isinstance(payload, dict):
+            submission_id = payload.get('submission_id')
+            logger.info(f"✅ Task created successfully: {submission_id}")
+            return submission_id
+        else:
+            logger.error(f"❌ Task creation failed: {response.status_code}")
+            if isinstance(payload, dict):
+                error_msg = str(payload.get('message', 'Unknown error'))
+                logger.info(f"Error message: {error_msg}")
                 
-                if remote_path:
-                    uploaded_files[file_path] = remote_path
-                    print(f"✅ Uploaded: {os.path.basename(file_path)}")
-                else:
-                    failed_uploads.append(file_path)
-                    print(f"❌ Failed to upload: {file_path}")
-        
-        # Report upload results
-        print(f"\n📊 Upload Summary:")
-        print(f"✅ Successful: {len(uploaded_files)}")
-        print(f"❌ Failed: {len(failed_uploads)}")
-        
-        if failed_uploads:
-            print(f"\n❌ Failed uploads:")
-            for file_path in failed_uploads:
-                print(f"  - {file_path}")
-        
-        if not uploaded_files:
-            print("❌ No files were uploaded successfully. Cannot proceed with task creation.")
-            return
-        
-        # Step 2: Create tasks
-        print(f"\n🔬 BATCH TASK CREATION MODULE")
-        print("="*60)
-        
-        # Process samples for task creation
-        processed_samples = process_samples_individual(data)
-        
-        created_tasks = []
-        failed_tasks = []
-        
-        for i, sample_config in enumerate(processed_samples, 1):
-            print(f"\n📋 Processing task {i}/{len(processed_samples)}")
-            
-            # Update file paths with remote paths
-            if sample_config['upload_vcf'] in uploaded_files:
-                sample_config['upload_vcf'] = uploaded_files[sample_config['upload_vcf']]
-            
-            if 'upload_father' in sample_config and sample_config['upload_father'] in uploaded_files:
-                sample_config['upload_father'] = uploaded_files[sample_config['upload_father']]
-            
-            if 'upload_mother' in sample_config and sample_config['upload_mother'] in uploaded_files:
-                sample_config['upload_mother'] = uploaded_files[sample_config['upload_mother']]
+                # Handle duplicate submission error
+                if "already been submitted" in error_msg:
+                    logger.info(f"💡 This task has already been submitted. The API prevents duplicate submissions.")
+                    logger.info(f"💡 Try using different titles or check if the task already exists.")
+            else:
+                logger.info(f"Response text: {response.text}")
+            return None
             
-            # Create task
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            task_data = {k: v for k, v in sample_config.items() if v is not None}
-            try:
-                print(f"🔬 Creating task for: {task_data['title']}")
-                print(f"Mode: {task_data['vcf_mode']}")
-                print(f"Assembly: {task_data['assembly']}")
-                response = requests.post(CREATE_TASK_URL, headers=headers, json=task_data)
-                if response.status_code == 200:
-                    result = response.json()
-                    submission_id = result.get('submission_id')
-                    print(f"✅ Task created successfully: {submission_id}")
-                    created_tasks.append({
-                        'title': sample_config['title'],
-                        'submission_id': submission_id
-                    })
-                    print(f"✅ Task created: {sample_config['title']}")
-                else:
-                    print(f"❌ Task creation failed: {response.status_code}")
-                    try:
-                        error_msg = response.json().get('message', 'Unknown error')
-                        print(f"Error message: {error_msg}")
-                        if "already been submitted" in error_msg:
-                            print(f"💡 This task has already been submitted. The API prevents duplicate submissions.")
-                            print(f"💡 Try using different titles or check if the task already exists.")
-                    except:
-                        print(f"Response text: {response.text}")
-                    failed_tasks.append(sample_config['title'])
-                    print(f"❌ Failed to create task: {sample_config['title']}")
-            except Exception as e:
-                print(f"❌ Error creating task: {e}")
-                failed_tasks.append(sample_config['title'])
-                print(f"❌ Failed to create task: {sample_config['title']}")
-        
-        # Final summary
-        print(f"\n🎉 BATCH PROCESSING COMPLETE")
-        print("="*60)
-        print(f"📤 Files uploaded: {len(uploaded_files)}/{len(data)}")
-        print(f"🔬 Tasks created: {len(created_tasks)}/{len(processed_samples)}")
-        
-        if created_tasks:
-            print(f"\n✅ Successfully created tasks:")
-            for task in created_tasks:
-                print(f"  - {task['title']}: {task['submission_id']}")
-        
-        if failed_tasks:
-            print(f"\n❌ Failed task creations:")
-            for title in failed_tasks:
-                print(f"  - {title}")
-        
-        if failed_uploads:
-            print(f"\n⚠️  Note: {len(failed_uploads)} files failed to upload and were skipped")
-        
     except Exception as e:
-        print(f"❌ Error in batch processing: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Error creating task: {e}")
+        return None
+
+def run_batch_full_module(token_file_path: str, csv_file_path: str,
+                          max_upload_workers: int = MAX_UPLOAD_WORKERS):
+    """Run the v1.0.0 style batch full module (upload + task creation).
+    
+    Every row is validated before the first upload, titles are sent as written,
+    and titles already recorded in TASK_RESULTS_FILE are not submitted again.
+    max_upload_workers bounds how many files are uploaded at the same time.
+    """
+    run_batch(token_file_path, csv_file_path, upload_file_batch, create_task_batch,
+              banner=["🚀 BATCH PROCESSING MODULE (v1.0.0 style)",
+                      "Using simple upload - one attempt per file, no request timeout; failed connections are retried"],
+              max_upload_workers=max_upload_workers,
+              validate_row=validate_csv_row,
+              skip_submitted=True)
 
 if __name__ == "__main__":
     import sys
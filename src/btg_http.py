@@ -0,0 +1,357 @@
+"""
+Virtual Geneticist API - Shared HTTP Session
+One pooled keep-alive session, request throttle, token loading and JSON helpers shared by the upload, task, status and batch modules.
+"""
+
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib encoder is used otherwise
+    orjson = None
+
+# === CONFIGURATION ===
+BASE_URL = "https://vg-api.btgenomics.com:8082/api"
+UPLOAD_URL = f"{BASE_URL}/upload"
+
+# Read uploads from disk, and send them, in 1 MiB blocks rather than the default 8-16 KiB
+UPLOAD_READ_BUFFER = 1 << 20
+
+# Keep-alive pool sized for the batch worker threads
+POOL_SIZE = max(32, (os.cpu_count() or 1) * 4)
+
+# TCP keepalive for pooled connections, so idle sockets between status polls or
+# batch phases are probed instead of being silently dropped by NAT/firewalls
+TCP_KEEPALIVE_IDLE = 60
+TCP_KEEPALIVE_INTERVAL = 15
+TCP_KEEPALIVE_COUNT = 4
+
+# Retry timeouts and transient server errors, honouring Retry-After on 429/503.
+# Only GET is in allowed_methods, so GET alone is replayed after a read timeout,
+# a dropped connection or any listed status. POST (task creation) is not
+# idempotent: the server may already have committed the task, so it is never
+# replayed once the request was sent, except on POST_RETRY_STATUSES, which the
+# server answers before doing any work. Connect failures are retried for both
+POST_RETRY_STATUSES = frozenset([429, 503])
+RETRY_OPTIONS = dict(
+    total=7,
+    backoff_factor=0.5,
+    status_forcelist=(408, 429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# Streamed upload bodies cannot be replayed, so uploads keep urllib3's default
+# method list (no POST) and only connection failures are retried
+UPLOAD_RETRY_OPTIONS = dict(total=3, backoff_factor=0.5)
+
+def retries_exhausted(error: Exception) -> bool:
+    """True when a requests error means the session's urllib3 Retry already gave up.
+    
+    Callers with their own retry loop use this to avoid retrying the same
+    connection failure again on top of the adapter's attempts.
+    """
+    from urllib3.exceptions import MaxRetryError
+    return bool(error.args) and isinstance(error.args[0], MaxRetryError)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0, jitter: float = 0.5) -> float:
+    """Seconds to wait before retry number attempt + 1: capped exponential growth
+    plus up to `jitter` of random extra, so clients that failed together do not
+    all retry at the same moment.
+    """
+    return min(cap, base * (2 ** attempt)) * (1 + random.uniform(0, jitter))
+
+# requests (and urllib3, ssl, certifi) is only imported once a request is made
+_session = None
+_session_lock = threading.Lock()
+
+def _socket_options():
+    """urllib3's defaults (TCP_NODELAY) plus keepalive, using the probes this platform supports."""
+    import socket
+    from urllib3.connection import HTTPConnection
+    
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE),
+                        ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL),
+                        ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT)):
+        option = getattr(socket, name, None)
+        if option is not None:
+            options.append((socket.IPPROTO_TCP, option, value))
+    return options
+
+def _ssl_context():
+    """One verifying TLS context for every pooled connection, with the CA bundle loaded once.
+    
+    Left to itself urllib3 builds a context and parses the whole CA bundle for
+    each new connection, which costs tens of milliseconds every time.
+    """
+    import ssl
+    from requests.utils import DEFAULT_CA_BUNDLE_PATH
+    
+    context = ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= getattr(ssl, "OP_NO_RENEGOTIATION", 0)
+    return context
+
+def get_session():
+    """Return the shared API session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                
+                socket_options = _socket_options()
+                ssl_context = _ssl_context()
+                
+                class ApiRetry(Retry):
+                    def is_retry(self, method, status_code, has_retry_after=False):
+                        # POST is outside allowed_methods, so read errors are never
+                        # replayed for it; only these statuses are
+                        if method == "POST":
+                            return bool(self.total) and status_code in POST_RETRY_STATUSES
+                        return super().is_retry(method, status_code, has_retry_after)
+                
+                class KeepAliveAdapter(HTTPAdapter):
+                    def __init__(self, blocksize=None, **kwargs):
+                        # Set before HTTPAdapter.__init__, which builds the pool manager
+                        self._blocksize = blocksize
+                        super().__init__(**kwargs)
+                    
+                    def init_poolmanager(self, *args, **kwargs):
+                        kwargs.setdefault("socket_options", socket_options)
+                        kwargs.setdefault("ssl_context", ssl_context)
+                        if self._blocksize:
+                            kwargs.setdefault("blocksize", self._blocksize)
+                        super().init_poolmanager(*args, **kwargs)
+                    
+                    def cert_verify(self, conn, url, verify, cert):
+                        super().cert_verify(conn, url, verify, cert)
+                        if verify is True:
+                            # ssl_context already trusts the default bundle; naming it
+                            # again would make urllib3 reload it on every connection
+                            conn.ca_certs = None
+                
+                session = requests.Session()
+                session.mount("https://", KeepAliveAdapter(
+                    pool_connections=POOL_SIZE,
+                    pool_maxsize=POOL_SIZE,
+                    max_retries=ApiRetry(**RETRY_OPTIONS)
+                ))
+                # Upload bodies are read from the encoder and sent in UPLOAD_READ_BUFFER blocks
+                session.mount(UPLOAD_URL, KeepAliveAdapter(
+                    blocksize=UPLOAD_READ_BUFFER,
+                    pool_connections=POOL_SIZE,
+                    pool_maxsize=POOL_SIZE,
+                    max_retries=Retry(**UPLOAD_RETRY_OPTIONS)
+                ))
+                # Close pooled keep-alive connections cleanly when the process exits
+                atexit.register(session.close)
+                _session = session
+    return _session
+
+def prewarm(url: str = UPLOAD_URL):
+    """Open a pooled connection for url on a background thread.
+    
+    The session, DNS lookup, TCP connect and TLS handshake are done while the
+    user is still answering prompts, so the first real request finds a warm
+    connection in the pool. Set BTG_NO_PREWARM to skip it (tests, offline use).
+    """
+    if os.environ.get("BTG_NO_PREWARM"):
+        return
+    
+    def warm():
+        try:
+            # HEAD leaves nothing to read, so the connection goes straight back to the pool
+            get_session().head(url, timeout=5)
+        except Exception:
+            pass  # the real request reports any network problem
+    
+    threading.Thread(target=warm, name="btg-prewarm", daemon=True).start()
+
+class AdaptiveThrottle:
+    """Token bucket whose refill rate adapts to HTTP 429 responses (AIMD).
+    
+    The rate is halved every time the server answers 429 and raised by a
+    fixed step after each window of successful requests, so a long batch
+    converges on the rate the API actually admits. A Retry-After on a
+    response that is still throttled pauses every caller for that long.
+    """
+    
+    def __init__(self, rate=10.0, burst=10, min_rate=0.5, max_rate=50.0,
+                 increase=1.0, window=200):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.window = window
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def record(self, throttled: bool, retry_after: float = None):
+        """Feed back whether the last request was rate limited, and for how long to hold off."""
+        with self._lock:
+            if throttled:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.window:
+                    self.rate = min(self.max_rate, self.rate + self.increase)
+                    self._successes = 0
+            if retry_after:
+                # Resume with one token so the first request after the pause goes straight out
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self._updated = self._paused_until
+                self._tokens = min(self._tokens, 1.0)
+
+# One bucket for the API host, shared by every batch worker
+THROTTLE = AdaptiveThrottle()
+
+class CircuitBreaker:
+    """Fail fast once the server keeps failing, instead of waiting out more timeouts.
+    
+    After `threshold` consecutive failures the breaker opens and callers are
+    turned away for `cool_down` seconds. Then one caller is let through as a
+    probe (half-open); its outcome closes the breaker or opens it again. A
+    probe that never reports back is replaced after another cool-down.
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    
+    def __init__(self, threshold=5, cool_down=30.0):
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """True if a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.cool_down:
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+    
+    def remaining(self) -> float:
+        """Seconds until the next probe is let through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(0.0, self.cool_down - (time.monotonic() - self.opened_at))
+    
+    def record(self, ok: bool):
+        """Report whether the server handled the request (any non-5xx answer counts)."""
+        with self._lock:
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+# One breaker for the upload endpoint, shared by every upload module and batch worker
+UPLOAD_BREAKER = CircuitBreaker()
+
+def _retry_after_seconds(response) -> float:
+    """Seconds from a Retry-After header given as a number; HTTP dates are left to urllib3."""
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value else 0.0
+    except ValueError:
+        return 0.0
+
+def throttled_post(url: str, **kwargs):
+    """POST through the shared session, pacing requests by the observed 429 rate."""
+    THROTTLE.acquire()
+    response = get_session().post(url, **kwargs)
+    
+    # urllib3 retries 429s internally; inspect its history to see them
+    retries = getattr(response.raw, 'retries', None)
+    history = retries.history if retries else ()
+    throttled = response.status_code == 429 or any(h.status == 429 for h in history)
+    
+    # A 429/503 that survived urllib3's retries still carries the server's wait
+    retry_after = _retry_after_seconds(response) if response.status_code in (429, 503) else 0.0
+    THROTTLE.record(throttled, retry_after)
+    
+    return response
+
+@lru_cache(maxsize=None)
+def auth_headers(token: str) -> dict:
+    """Build the bearer auth header once per token (treat as read-only)."""
+    return {"Authorization": f"Bearer {token}"}
+
+@lru_cache(maxsize=None)
+def json_headers(token: str) -> dict:
+    """Build the JSON request headers once per token (treat as read-only)."""
+    return {**auth_headers(token), "Content-Type": "application/json"}
+
+@lru_cache(maxsize=8)
+def _read_token_cached(path: str, mtime_ns: int, size: int) -> str:
+    """Read and strip a token file; the stat fields key the cache so edits are re-read."""
+    with open(path, 'r') as f:
+        token = f.read().strip()
+    if not token:
+        raise ValueError("Token file is empty")
+    return token
+
+def read_token_from_file(token_file_path):
+    """Read token from a text file, parsing it once per process while unchanged."""
+    try:
+        st = os.stat(token_file_path)
+        return _read_token_cached(os.path.abspath(token_file_path), st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Token file not found: {token_file_path}")
+    except Exception as e:
+        raise Exception(f"Error reading token file: {e}")
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, optionally indented for results files."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+def json_loads(data):
+    """Parse JSON from bytes or str; raises a json.JSONDecodeError subclass on bad input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,55 @@
+"""
+Virtual Geneticist API - Shared Progress Logging
+Console loggers for the status, upload and batch modules, with an optional queued writer for worker threads.
+"""
+
+import logging
+import queue
+import sys
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# One stdout handler shared by every batch logger
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(logging.Formatter("%(message)s"))
+
+# Every client logger is named btg.* and takes its level from this parent
+_root_logger = logging.getLogger("btg")
+_root_logger.setLevel(logging.INFO)
+
+def set_verbose(verbose: bool):
+    """Show DEBUG records from every client logger, or only INFO and above."""
+    _root_logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+# Logger the upload modules report per-file progress through
+UPLOAD_PROGRESS_LOGGER = "btg.upload"
+
+def set_progress(enabled: bool):
+    """Show or hide per-file upload progress; warnings and errors always print."""
+    logging.getLogger(UPLOAD_PROGRESS_LOGGER).setLevel(logging.NOTSET if enabled else logging.WARNING)
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger that prints bare messages to stdout."""
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    if _console_handler not in logger.handlers:
+        logger.addHandler(_console_handler)
+    return logger
+
+@contextmanager
+def queued_logging(logger: logging.Logger):
+    """Hand log records to a queue drained by a single background writer thread."""
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    listener = QueueListener(log_queue, _console_handler)
+    
+    logger.removeHandler(_console_handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        # stop() flushes every queued record before returning
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        logger.addHandler(_console_handler)
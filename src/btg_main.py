@@ -7,13 +7,14 @@ A modular client for uploading files, creating tasks, and checking status.
 import sys
 import json
 import argparse
+import importlib
+from typing import NamedTuple, Optional
 
-# Import the individual modules
+# Only the lightweight modules are imported up front; the upload, task and status
+# modules pull in requests and are imported by the branch that runs them
 try:
-    from btg_upload_module import run_upload_module
-    from btg_task_module import run_create_task_module
-    from btg_status_module import run_status_check_module
-    from btg_batch_module import run_batch_full_module
+    from btg_batch_module import MAX_UPLOAD_WORKERS
+    from btg_log import set_progress, set_verbose
 except ImportError as e:
     print(f"❌ Error importing modules: {e}")
     print("Make sure all module files are in the same directory:")
@@ -21,8 +22,51 @@ except ImportError as e:
     print("  - btg_task_module.py") 
     print("  - btg_status_module.py")
     print("  - btg_batch_module.py")
+    print("  - btg_http.py")
+    print("  - btg_log.py")
+    print("  - btg_upload_common.py")
     sys.exit(1)
 
+def _load_runner(module_name: str, attr: str):
+    """Import a module's entry point on first use, exiting with a hint if it is missing."""
+    try:
+        return getattr(importlib.import_module(module_name), attr)
+    except ImportError as e:
+        print(f"❌ Error importing {module_name}: {e}")
+        print("Make sure all module files are in the same directory and requirements.txt is installed")
+        sys.exit(1)
+
+class CliCtx(NamedTuple):
+    """Command-line settings, parsed once in main and handed to every module run."""
+    token_path: Optional[str]
+    file_path: Optional[str] = None
+    prefix: Optional[str] = None
+    task_config: Optional[str] = None
+    overrides: Optional[str] = None
+    submission_id: Optional[str] = None
+    csv_file: Optional[str] = None
+    max_concurrency: int = MAX_UPLOAD_WORKERS
+    no_progress: bool = False
+    verbose: bool = False
+    skip_completed: bool = False
+    
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "CliCtx":
+        """Copy the parsed arguments into an immutable context."""
+        return cls(
+            token_path=args.token,
+            file_path=args.file_path,
+            prefix=args.prefix,
+            task_config=args.task_config,
+            overrides=args.overrides,
+            submission_id=args.submission_id,
+            csv_file=args.csv_file,
+            max_concurrency=args.max_concurrency,
+            no_progress=args.no_progress,
+            verbose=args.verbose,
+            skip_completed=args.skip_completed
+        )
+
 def print_banner():
     """Print the application banner."""
     print("\n" + "="*70)
@@ -41,16 +85,47 @@ def show_configuration():
     print("📊 Status module accepts submission_id parameter")
     print("🚀 Batch module processes CSV files for full batch operations (upload + tasks)")
 
-def interactive_mode(token_file_path=None):
+def _report_submission(submission_id):
+    if submission_id:
+        print(f"✅ New submission ID saved: {submission_id}")
+
+# Interactive menu entries; each prompts for whatever the command line did not give
+def _menu_upload(ctx: CliCtx):
+    _load_runner("btg_upload_module", "run_upload_module")(ctx.token_path)
+
+def _menu_task(ctx: CliCtx):
+    _report_submission(_load_runner("btg_task_module", "run_create_task_module")(ctx.token_path))
+
+def _menu_status(ctx: CliCtx):
+    _load_runner("btg_status_module", "run_status_check_module")(ctx.token_path, skip_completed=ctx.skip_completed)
+
+def _menu_batch_full(ctx: CliCtx):
+    csv_file = input("Enter CSV file path: ").strip()
+    _load_runner("btg_batch_module", "run_batch_full_module")(ctx.token_path, csv_file, max_upload_workers=ctx.max_concurrency)
+
+def _invalid_choice(ctx: CliCtx):
+    print("❌ Invalid choice. Please enter a number between 1 and 6.")
+
+MENU_EXIT = "6"
+MENU_ACTIONS = {
+    "1": _menu_upload,
+    "2": _menu_task,
+    "3": _menu_status,
+    "4": _menu_batch_full,
+    "5": lambda ctx: show_configuration(),
+}
+
+def interactive_mode(ctx: CliCtx):
     """Run the client in interactive mode with menu."""
     print_banner()
     
     # If no token file provided, ask for it
-    if not token_file_path:
+    if not ctx.token_path:
         token_file_path = input("Enter token file path: ").strip()
         if not token_file_path:
             print("❌ Token file path is required")
             return
+        ctx = ctx._replace(token_path=token_file_path)
     
     while True:
         print("\n📋 MAIN MENU")
@@ -64,27 +139,38 @@ def interactive_mode(token_file_path=None):
         
         choice = input("\nEnter your choice (1-6): ").strip()
         
-        if choice == "1":
-            run_upload_module(token_file_path, show_progress=not args.no_progress)
-        elif choice == "2":
-            submission_id = run_create_task_module(token_file_path)
-            if submission_id:
-                print(f"✅ New submission ID saved: {submission_id}")
-        elif choice == "3":
-            run_status_check_module(token_file_path)
-        elif choice == "4":
-            csv_file = input("Enter CSV file path: ").strip()
-            run_batch_full_module(token_file_path, csv_file)
-        elif choice == "5":
-            show_configuration()
-        elif choice == "6":
+        if choice == MENU_EXIT:
             print("\n👋 Thank you for using the Virtual Geneticist API Client!")
             break
-        else:
-            print("❌ Invalid choice. Please enter a number between 1 and 6.")
+        MENU_ACTIONS.get(choice, _invalid_choice)(ctx)
         
         input("\nPress Enter to continue...")
 
+# Command-line modules; each runs non-interactively where its arguments allow
+def _run_upload(ctx: CliCtx):
+    _load_runner("btg_upload_module", "run_upload_module")(ctx.token_path, ctx.file_path, ctx.prefix)
+
+def _run_task(ctx: CliCtx):
+    run_create_task_module = _load_runner("btg_task_module", "run_create_task_module")
+    _report_submission(run_create_task_module(ctx.token_path, ctx.task_config, ctx.overrides))
+
+def _run_status(ctx: CliCtx):
+    _load_runner("btg_status_module", "run_status_check_module")(ctx.token_path, ctx.submission_id, ctx.skip_completed)
+
+def _run_batch_full(ctx: CliCtx):
+    if not ctx.csv_file:
+        print("❌ CSV file path is required for batch full process. Use --csv-file option.")
+        return
+    _load_runner("btg_batch_module", "run_batch_full_module")(ctx.token_path, ctx.csv_file, max_upload_workers=ctx.max_concurrency)
+
+COMMANDS = {
+    'upload': _run_upload,
+    'task': _run_task,
+    'status': _run_status,
+    'config': lambda ctx: show_configuration(),
+    'batch-full': _run_batch_full,
+}
+
 def main():
     """Main function with command-line argument parsing."""
     parser = argparse.ArgumentParser(
@@ -95,8 +181,11 @@ Examples:
   python btg_client.py upload --token token.txt                                                       # Run upload module
   python btg_client.py upload --token token.txt --file-path /path/to/file.vcf.gz --prefix sample-P    # Upload with parameters
   python btg_client.py task   --token token.txt --task-config task_config.json                        # Run task creation module
+  python btg_client.py task   --token token.txt --task-config task_config.json --overrides o.json     # Task creation without field prompts
   python btg_client.py status --token token.txt --submission-id b48e943c42659c5011fa571d80d0e177      # Run status checking module
+  python btg_client.py status --token token.txt --submission-id b48e943c42659c5011fa571d80d0e177 -v   # Status check with per-request details
   python btg_client.py batch-full --token token.txt --csv-file samples.csv                            # Full batch process
+  python btg_client.py batch-full --token token.txt --csv-file samples.csv --max-concurrency 4        # Full batch, 4 uploads at a time
   python btg_client.py config --token token.txt                                                       # Show current configuration
   python btg_client.py --token token.txt --interactive                                                # Run in interactive mode
   python btg_client.py --token token.txt                                                              # Run in interactive mode (default)
@@ -124,6 +213,11 @@ Examples:
         help='Path to the task configuration JSON file (for task module)'
     )
     
+    parser.add_argument(
+        '--overrides', '-o',
+        help='Path to a JSON file whose values override the task configuration, skipping the field prompts (for task module)'
+    )
+    
     parser.add_argument(
         '--submission-id', '-s',
         help='Submission ID to check status for (for status module)'
@@ -136,16 +230,35 @@ Examples:
     
 
     
+    parser.add_argument(
+        '--max-concurrency', '-j',
+        type=int,
+        default=MAX_UPLOAD_WORKERS,
+        help=f'Maximum number of files uploaded at the same time (for batch modules, default: {MAX_UPLOAD_WORKERS})'
+    )
+    
     parser.add_argument(
         '--no-progress', '-np',
         action='store_true',
-        help='Disable progress bars for uploads'
+        help='Hide per-file upload progress messages; errors are still shown (for upload and batch modules)'
+    )
+    
+    parser.add_argument(
+        '--skip-completed',
+        action='store_true',
+        help='Report submissions already saved as COMPLETED, FAILED or CANCELLED without querying the API (for status module)'
+    )
+    
+    parser.add_argument(
+        '--verbose', '-v',
+        action='store_true',
+        help='Show per-request details for status checks and uploads'
     )
     
     parser.add_argument(
         'module',
         nargs='?',
-        choices=['upload', 'task', 'status', 'config', 'batch-full'],
+        choices=list(COMMANDS),
         help='Module to run: upload, task, status, config, or batch-full'
     )
     
@@ -156,30 +269,19 @@ Examples:
     )
     
     args = parser.parse_args()
+    ctx = CliCtx.from_args(args)
+    set_verbose(ctx.verbose)
+    set_progress(not ctx.no_progress)
     
     # If no module specified or interactive flag used, run interactive mode
     if not args.module or args.interactive:
-        interactive_mode(args.token)
+        interactive_mode(ctx)
         return
     
     # Run the specified module
     print_banner()
     
-    if args.module == 'upload':
-        run_upload_module(args.token, args.file_path, args.prefix, show_progress=not args.no_progress)
-    elif args.module == 'task':
-        submission_id = run_create_task_module(args.token, args.task_config)
-        if submission_id:
-            print(f"✅ New submission ID saved: {submission_id}")
-    elif args.module == 'status':
-        run_status_check_module(args.token, args.submission_id)
-    elif args.module == 'batch-full':
-        if not args.csv_file:
-            print("❌ CSV file path is required for batch full process. Use --csv-file option.")
-            return
-        run_batch_full_module(args.token, args.csv_file)
-    elif args.module == 'config':
-        show_configuration()
+    COMMANDS[args.module](ctx)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -5,38 +5,129 @@ Handles checking and monitoring task status using the Virtual Geneticist API.
 
 import requests
 import json
+import os
 import time
 import sys
 from datetime import datetime
 
+from btg_http import auth_headers, get_session, json_dumps, json_loads, read_token_from_file
+from btg_log import get_logger
+
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 GET_STATUS_URL = f"{BASE_URL}/getstatus"
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
+# Last known status of each submission, kept across runs in the working directory
+STATUS_RESULTS_FILE = "status_results.json"
+
+# Longest wait between monitor checks once the status stops changing
+MAX_POLL_INTERVAL = 300
+
+# Status -> emoji and description, looked up on every report
+STATUS_EMOJI = {
+    'CREATED': '🟡',
+    'INITIALIZED': '🟡',
+    'RUNNING': '🟢',
+    'COMPLETED': '✅',
+    'FAILED': '❌',
+    'CANCELLED': '⏹️'
+}
+STATUS_DESCRIPTION = {
+    'CREATED': 'Task has been created and is waiting to be processed',
+    'INITIALIZED': 'Task has been initialized and is being prepared for processing',
+    'RUNNING': 'Task is currently being processed by the analysis pipeline',
+    'COMPLETED': 'Task has been completed successfully',
+    'FAILED': 'Task processing failed - check error logs',
+    'CANCELLED': 'Task was cancelled by user or system'
+}
+
+# Statuses after which a task no longer changes
+TERMINAL_STATUSES = frozenset(['COMPLETED', 'FAILED', 'CANCELLED'])
+
+# (label, field) for each file listed in the status report
+STATUS_FILES = (
+    ('Proband VCF', 'upload_vcf'),
+    ('Father VCF', 'upload_father'),
+    ('Mother VCF', 'upload_mother'),
+    ('Clinical File', 'upload_clinical'),
+    ('CNV File', 'upload_cnv')
+)
+
+# Status output goes through a logger; per-request chatter is only shown with --verbose
+logger = get_logger("btg.status")
+
+# submission_id -> (ETag, Last-Modified, last status, time seen) for conditional GETs,
+# loaded from STATUS_RESULTS_FILE on first use
+_STATUS_CACHE = None
+
+def load_status_results(results_path: str = STATUS_RESULTS_FILE) -> dict:
+    """Load the submission_id -> (ETag, Last-Modified, status data, time seen) map saved by earlier runs."""
+    if not os.path.exists(results_path):
+        return {}
     try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
+        with open(results_path, 'rb') as f:
+            saved = json_loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Ignoring unreadable {results_path}: {e}")
+        return {}
+    if not isinstance(saved, dict):
+        return {}
+    return {
+        submission_id: (entry.get('etag'), entry.get('last_modified'), entry['status_data'], entry.get('last_seen'))
+        for submission_id, entry in saved.items()
+        if isinstance(entry, dict) and isinstance(entry.get('status_data'), dict)
+    }
+
+def save_status_results(cache: dict, results_path: str = STATUS_RESULTS_FILE):
+    """Write the status map atomically so a crash never leaves a partial file."""
+    saved = {
+        submission_id: {
+            'status': status_data.get('status'),
+            'etag': etag,
+            'last_modified': last_modified,
+            'last_seen': last_seen,
+            'status_data': status_data
+        }
+        for submission_id, (etag, last_modified, status_data, last_seen) in cache.items()
+    }
+    tmp_path = f"{results_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(json_dumps(saved, indent=True))
+    os.replace(tmp_path, results_path)
+
+def _status_cache() -> dict:
+    global _STATUS_CACHE
+    if _STATUS_CACHE is None:
+        _STATUS_CACHE = load_status_results()
+    return _STATUS_CACHE
 
-def check_task_status(submission_id, token):
-    """Check the status of a task using the Virtual Geneticist API."""
+def check_task_status(submission_id, token, skip_completed=False):
+    """Check the status of a task using the Virtual Geneticist API.
+    
+    With skip_completed, a submission already saved in a terminal status
+    (COMPLETED, FAILED, CANCELLED) is answered from STATUS_RESULTS_FILE
+    without a request.
+    """
     
     if not submission_id or submission_id == "your_submission_id_here":
-        print("❌ Please set a valid submission_id")
+        logger.error("❌ Please set a valid submission_id")
         return None
     
-    # Prepare headers
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    status_cache = _status_cache()
+    cached = status_cache.get(submission_id)
+    if skip_completed and cached and cached[2].get('status') in TERMINAL_STATUSES:
+        logger.info(f"⏭️  Submission {submission_id} already {cached[2]['status']}; not checking again")
+        return cached[2]
+    
+    # Prepare headers; revalidate the last response instead of refetching it
+    headers = auth_headers(token)
+    if cached:
+        etag, last_modified = cached[:2]
+        headers = dict(headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
     
     # Prepare query parameters
     params = {
@@ -44,110 +135,105 @@ def check_task_status(submission_id, token):
     }
     
     try:
-        print(f"Checking status for submission ID: {submission_id}")
-        print("-" * 50)
+        logger.debug("Checking status for submission ID: %s\n%s", submission_id, "-" * 50)
         
-        response = requests.get(GET_STATUS_URL, headers=headers, params=params)
+        response = get_session().get(GET_STATUS_URL, headers=headers, params=params)
         
         # Handle response
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ Status retrieved successfully!")
+        if response.status_code == 304 and cached:
+            logger.debug("✅ Status unchanged since last check")
+            return cached[2]
+        elif response.status_code == 200:
+            result = json_loads(response.content)
+            logger.debug("✅ Status retrieved successfully!")
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            status_cache[submission_id] = (etag, last_modified, result, time.time())
+            # Polling mostly sees the same payload again; only a change is worth a rewrite
+            if not cached or cached[2] != result:
+                try:
+                    save_status_results(status_cache)
+                except OSError as e:
+                    logger.warning(f"⚠️  Could not save {STATUS_RESULTS_FILE}: {e}")
             return result
         else:
-            print(f"❌ Status check failed with status code: {response.status_code}")
+            logger.error(f"❌ Status check failed with status code: {response.status_code}")
             try:
-                error_msg = response.json().get('message', 'Unknown error')
-                print(f"Error message: {error_msg}")
+                error_msg = json_loads(response.content).get('message', 'Unknown error')
+                logger.info(f"Error message: {error_msg}")
             except:
-                print(f"Response text: {response.text}")
+                logger.info(f"Response text: {response.text}")
             return None
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
+        logger.error(f"❌ Network error: {e}")
         return None
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.error(f"❌ Unexpected error: {e}")
         return None
 
 def format_status_output(status_data):
     """Format and display the status information in a readable way."""
-    
-    print("\n" + "="*60)
-    print("📊 TASK STATUS REPORT")
-    print("="*60)
-    
-    # Basic task information
-    print(f"📋 Title: {status_data.get('title', 'N/A')}")
-    print(f"📁 Project: {status_data.get('project', 'N/A')}")
-    print(f"🔬 Analysis Mode: {status_data.get('vcf_mode', 'N/A')}")
-    print(f"🧬 Assembly: {status_data.get('assembly', 'N/A')}")
-    print(f"🆔 Task ID: {status_data.get('task_id', 'N/A')}")
-    print(f"📅 Creation Time: {status_data.get('creation_time', 'N/A')}")
-    print(f"🔧 Pipeline Version: {status_data.get('version', 'N/A')}")
+    get = status_data.get
     
     # Status with emoji
-    status = status_data.get('status', 'UNKNOWN')
-    status_emoji = {
-        'CREATED': '🟡',
-        'INITIALIZED': '🟡', 
-        'RUNNING': '🟢',
-        'COMPLETED': '✅',
-        'FAILED': '❌',
-        'CANCELLED': '⏹️'
-    }
-    emoji = status_emoji.get(status, '❓')
-    print(f"📊 Status: {emoji} {status}")
+    status = get('status', 'UNKNOWN')
+    emoji = STATUS_EMOJI.get(status, '❓')
     
     # File information
-    print("\n📁 FILES:")
-    print("-" * 30)
-    files = [
-        ('Proband VCF', 'upload_vcf'),
-        ('Father VCF', 'upload_father'), 
-        ('Mother VCF', 'upload_mother'),
-        ('Clinical File', 'upload_clinical'),
-        ('CNV File', 'upload_cnv')
-    ]
-    
-    for file_desc, file_key in files:
-        file_path = status_data.get(file_key)
-        if file_path:
-            print(f"  ✅ {file_desc}: {file_path}")
-        else:
-            print(f"  ❌ {file_desc}: Not provided")
+    file_lines = "\n".join(
+        f"  ✅ {file_desc}: {get(file_key)}" if get(file_key) else f"  ❌ {file_desc}: Not provided"
+        for file_desc, file_key in STATUS_FILES
+    )
     
-    print("="*60)
+    # The whole report is emitted as one record
+    logger.info(
+        f"\n{'=' * 60}\n"
+        f"📊 TASK STATUS REPORT\n"
+        f"{'=' * 60}\n"
+        f"📋 Title: {get('title', 'N/A')}\n"
+        f"📁 Project: {get('project', 'N/A')}\n"
+        f"🔬 Analysis Mode: {get('vcf_mode', 'N/A')}\n"
+        f"🧬 Assembly: {get('assembly', 'N/A')}\n"
+        f"🆔 Task ID: {get('task_id', 'N/A')}\n"
+        f"📅 Creation Time: {get('creation_time', 'N/A')}\n"
+        f"🔧 Pipeline Version: {get('version', 'N/A')}\n"
+        f"📊 Status: {emoji} {status}\n"
+        f"\n📁 FILES:\n"
+        f"{'-' * 30}\n"
+        f"{file_lines}\n"
+        f"{'=' * 60}"
+    )
 
 def get_status_description(status):
     """Get a human-readable description of the status."""
-    descriptions = {
-        'CREATED': 'Task has been created and is waiting to be processed',
-        'INITIALIZED': 'Task has been initialized and is being prepared for processing',
-        'RUNNING': 'Task is currently being processed by the analysis pipeline',
-        'COMPLETED': 'Task has been completed successfully',
-        'FAILED': 'Task processing failed - check error logs',
-        'CANCELLED': 'Task was cancelled by user or system'
-    }
-    return descriptions.get(status, f'Unknown status: {status}')
+    description = STATUS_DESCRIPTION.get(status)
+    return description if description is not None else f'Unknown status: {status}'
 
-def monitor_task(submission_id, token, interval=30, max_checks=20):
-    """Monitor a task status with periodic checks."""
-    print(f"🔍 Starting task monitoring...")
-    print(f"⏱️  Check interval: {interval} seconds")
-    print(f"🔄 Maximum checks: {max_checks}")
-    print("-" * 50)
+def monitor_task(submission_id, token, interval=30, max_checks=20, backoff=1.5, skip_completed=False):
+    """Monitor a task status with periodic checks.
+    
+    The wait grows by `backoff` after each unchanged check (up to
+    MAX_POLL_INTERVAL) and drops back to `interval` when the status changes.
+    skip_completed is passed on to check_task_status.
+    """
+    logger.info(f"🔍 Starting task monitoring...\n"
+                f"⏱️  Check interval: {interval} seconds\n"
+                f"🔄 Maximum checks: {max_checks}\n"
+                f"{'-' * 50}")
     
     check_count = 0
     last_status = None
+    wait = interval
+    max_wait = max(interval, MAX_POLL_INTERVAL)
     
     while check_count < max_checks:
         check_count += 1
-        print(f"\n🔄 Check #{check_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info(f"\n🔄 Check #{check_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        status_data = check_task_status(submission_id, token)
+        status_data = check_task_status(submission_id, token, skip_completed)
         if not status_data:
-            print("❌ Failed to retrieve status, stopping monitoring")
+            logger.error("❌ Failed to retrieve status, stopping monitoring")
             break
         
         current_status = status_data.get('status', 'UNKNOWN')
@@ -155,26 +241,32 @@ def monitor_task(submission_id, token, interval=30, max_checks=20):
         # Show full status on first check or status change
         if last_status != current_status:
             format_status_output(status_data)
-            print(f"\n📝 Status Description: {get_status_description(current_status)}")
+            logger.info(f"\n📝 Status Description: {get_status_description(current_status)}")
             last_status = current_status
+            wait = interval
         else:
-            print(f"📊 Status: {current_status} (no change)")
+            logger.info(f"📊 Status: {current_status} (no change)")
+            wait = min(wait * backoff, max_wait)
         
         # Check if task is finished
-        if current_status in ['COMPLETED', 'FAILED', 'CANCELLED']:
-            print(f"\n🎉 Task monitoring complete! Final status: {current_status}")
+        if current_status in TERMINAL_STATUSES:
+            logger.info(f"\n🎉 Task monitoring complete! Final status: {current_status}")
             break
         
         # Wait before next check (except on last iteration)
         if check_count < max_checks:
-            print(f"⏳ Waiting {interval} seconds before next check...")
-            time.sleep(interval)
+            logger.info(f"⏳ Waiting {wait:g} seconds before next check...")
+            time.sleep(wait)
     
     if check_count >= max_checks:
-        print(f"\n⏰ Maximum monitoring time reached ({max_checks} checks)")
+        logger.info(f"\n⏰ Maximum monitoring time reached ({max_checks} checks)")
 
-def run_status_check_module(token_file_path=None, submission_id=None):
-    """Run the status checking module."""
+def run_status_check_module(token_file_path=None, submission_id=None, skip_completed=False):
+    """Run the status checking module.
+    
+    With skip_completed, submissions saved in a terminal status by an
+    earlier run are reported from STATUS_RESULTS_FILE without a request.
+    """
     print("\n" + "="*60)
     print("📊 STATUS CHECKING MODULE")
     print("="*60)
@@ -221,20 +313,20 @@ def run_status_check_module(token_file_path=None, submission_id=None):
     
     if choice == "1":
         # Single status check
-        status_data = check_task_status(submission_id, token)
+        status_data = check_task_status(submission_id, token, skip_completed)
         if status_data:
             format_status_output(status_data)
-            print(f"\n📝 Status Description: {get_status_description(status_data.get('status', 'UNKNOWN'))}")
+            logger.info(f"\n📝 Status Description: {get_status_description(status_data.get('status', 'UNKNOWN'))}")
     
     elif choice == "2":
         # Continuous monitoring
         try:
             interval = int(input("Enter check interval in seconds (default 30): ") or "30")
             max_checks = int(input("Enter maximum number of checks (default 20): ") or "20")
-            monitor_task(submission_id, token, interval, max_checks)
+            monitor_task(submission_id, token, interval, max_checks, skip_completed=skip_completed)
         except ValueError:
             print("❌ Invalid input, using defaults")
-            monitor_task(submission_id, token)
+            monitor_task(submission_id, token, skip_completed=skip_completed)
     
     elif choice == "3":
         return
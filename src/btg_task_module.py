@@ -3,21 +3,42 @@ Virtual Geneticist API - Task Creation Module
 Handles creating analysis tasks using the Virtual Geneticist API.
 """
 
+import copy
 import requests
 import json
 import sys
 import os
 
+from btg_http import get_session, json_dumps, json_headers, json_loads, read_token_from_file
+
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 CREATE_TASK_URL = f"{BASE_URL}/createtask"
 
+# (connect, read) timeout for task creation requests
+TASK_TIMEOUT = (10, 120)
+
+# Parsed config files keyed by path, reused while (mtime, size) is unchanged
+_CONFIG_CACHE = {}
+
+def _file_signature(file_path):
+    """Return (mtime_ns, size) so edited files are re-read."""
+    st = os.stat(file_path)
+    return (st.st_mtime_ns, st.st_size)
+
 def read_config_from_file(config_file_path):
     """Read configuration from a JSON file."""
     try:
-        with open(config_file_path, 'r') as f:
-            config = json.load(f)
-        return config
+        signature = _file_signature(config_file_path)
+        cached = _CONFIG_CACHE.get(config_file_path)
+        if cached and cached[0] == signature:
+            # Callers may edit the returned config, so never hand out the cached dict
+            return copy.deepcopy(cached[1])
+        
+        with open(config_file_path, 'rb') as f:
+            config = json_loads(f.read())
+        _CONFIG_CACHE[config_file_path] = (signature, config)
+        return copy.deepcopy(config)
     except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file not found: {config_file_path}")
     except json.JSONDecodeError as e:
@@ -25,109 +46,139 @@ def read_config_from_file(config_file_path):
     except Exception as e:
         raise Exception(f"Error reading configuration file: {e}")
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
+# Task validation rules, built once at import
+REQUIRED_TASK_FIELDS = ("title", "project", "vcf_mode", "assembly")
+VALID_VCF_MODES = frozenset(("SNP", "TRIO", "CARRIER"))
+VALID_ASSEMBLIES = frozenset(("hg19", "hg38"))
+VCF_MODES_MSG = "SNP, TRIO, CARRIER"
+ASSEMBLIES_MSG = "hg19, hg38"
+
+# VCF uploads each analysis mode needs
+MODE_REQUIRED_FILES = {
+    "SNP": ("upload_vcf",),
+    "TRIO": ("upload_vcf", "upload_father", "upload_mother"),
+    "CARRIER": ("upload_father", "upload_mother"),
+}
+
+# Server-side length limits for free-text fields
+FIELD_MAX_LENGTHS = (("title", 256), ("project", 256), ("clinical_info", 4096))
 
 def validate_task_config(config):
     """Validate the task configuration based on VCF mode requirements."""
-    errors = []
+    cfg_get = config.get
     
     # Check required fields
-    required_fields = ["title", "project", "vcf_mode", "assembly"]
-    for field in required_fields:
-        if not config.get(field):
-            errors.append(f"Missing required field: {field}")
+    errors = [f"Missing required field: {field}" for field in REQUIRED_TASK_FIELDS if not cfg_get(field)]
     
     # Validate vcf_mode
-    valid_modes = ["SNP", "TRIO", "CARRIER"]
-    if config.get("vcf_mode") not in valid_modes:
-        errors.append(f"Invalid vcf_mode: {config.get('vcf_mode')}. Must be one of: {', '.join(valid_modes)}")
+    vcf_mode = cfg_get("vcf_mode")
+    if vcf_mode not in VALID_VCF_MODES:
+        errors.append(f"Invalid vcf_mode: {vcf_mode}. Must be one of: {VCF_MODES_MSG}")
     
     # Validate assembly
-    valid_assemblies = ["hg19", "hg38"]
-    if config.get("assembly") not in valid_assemblies:
-        errors.append(f"Invalid assembly: {config.get('assembly')}. Must be one of: {', '.join(valid_assemblies)}")
+    assembly = cfg_get("assembly")
+    if assembly not in VALID_ASSEMBLIES:
+        errors.append(f"Invalid assembly: {assembly}. Must be one of: {ASSEMBLIES_MSG}")
     
     # Check clinical information (either upload_clinical or clinical_info is required)
-    if not config.get("upload_clinical") and not config.get("clinical_info"):
+    if not cfg_get("upload_clinical") and not cfg_get("clinical_info"):
         errors.append("Either upload_clinical or clinical_info is required")
     
     # Check VCF file requirements based on mode
-    vcf_mode = config.get("vcf_mode")
-    if vcf_mode in ["SNP", "TRIO"]:
-        if not config.get("upload_vcf"):
-            errors.append(f"upload_vcf is required for {vcf_mode} mode")
-    
-    if vcf_mode in ["TRIO", "CARRIER"]:
-        if not config.get("upload_father"):
-            errors.append(f"upload_father is required for {vcf_mode} mode")
-        if not config.get("upload_mother"):
-            errors.append(f"upload_mother is required for {vcf_mode} mode")
+    errors.extend(
+        f"{field} is required for {vcf_mode} mode"
+        for field in MODE_REQUIRED_FILES.get(vcf_mode, ())
+        if not cfg_get(field)
+    )
     
     # Check field length limits
-    if config.get("title") and len(config["title"]) > 256:
-        errors.append("title must be 256 characters or less")
+    for field, max_length in FIELD_MAX_LENGTHS:
+        value = cfg_get(field)
+        if value and len(value) > max_length:
+            errors.append(f"{field} must be {max_length} characters or less")
     
-    if config.get("project") and len(config["project"]) > 256:
-        errors.append("project must be 256 characters or less")
+    return errors
+
+class OutputBuffer:
+    """Collect output lines and write them to stdout in a single call."""
     
-    if config.get("clinical_info") and len(config["clinical_info"]) > 4096:
-        errors.append("clinical_info must be 4096 characters or less")
+    def __init__(self):
+        self.lines = []
     
-    return errors
+    def __call__(self, line=""):
+        self.lines.append(str(line))
+    
+    def flush(self):
+        """Write the buffered lines; call before any input() prompt."""
+        if self.lines:
+            sys.stdout.write("\n".join(self.lines) + "\n")
+            self.lines.clear()
+
+def _build_body(config):
+    """Drop None values and serialize once; retries resend the same bytes."""
+    task_data = {k: v for k, v in config.items() if v is not None}
+    return task_data, json_dumps(task_data)
+
+def _submit(body, headers):
+    """POST a pre-serialized task body through the shared session."""
+    return get_session().post(CREATE_TASK_URL, headers=headers, data=body, timeout=TASK_TIMEOUT)
+
+def report_config_errors(errors):
+    """Print the validation errors for a task configuration in one block."""
+    log = OutputBuffer()
+    log("❌ Configuration errors:")
+    for error in errors:
+        log(f"  - {error}")
+    log.flush()
 
-def create_task(config, token):
-    """Create a new analysis task using the Virtual Geneticist API."""
+def create_task(config, token, validate=True):
+    """Create a new analysis task using the Virtual Geneticist API.
+    
+    Pass validate=False when the caller has already run validate_task_config
+    on this exact config.
+    """
     
     # Validate configuration
-    errors = validate_task_config(config)
-    if errors:
-        print("❌ Configuration errors:")
-        for error in errors:
-            print(f"  - {error}")
-        return None
+    if validate:
+        errors = validate_task_config(config)
+        if errors:
+            report_config_errors(errors)
+            return None
     
     # Prepare headers
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    headers = json_headers(token)
     
-    # Remove None values from config
-    task_data = {k: v for k, v in config.items() if v is not None}
+    # Remove None values from config and serialize the body once
+    task_data, body = _build_body(config)
     
     try:
-        print("Creating analysis task...")
-        print(f"Mode: {task_data['vcf_mode']}")
-        print(f"Assembly: {task_data['assembly']}")
-        print(f"Title: {task_data['title']}")
-        print("-" * 40)
+        log = OutputBuffer()
+        log("Creating analysis task...")
+        log(f"Mode: {task_data['vcf_mode']}")
+        log(f"Assembly: {task_data['assembly']}")
+        log(f"Title: {task_data['title']}")
+        log("-" * 40)
+        log.flush()
         
-        response = requests.post(CREATE_TASK_URL, headers=headers, json=task_data)
+        response = _submit(body, headers)
+        
+        # Parse the body once; non-JSON bodies fall back to the raw text
+        try:
+            payload = json_loads(response.content)
+        except ValueError:
+            payload = None
         
         # Handle response
-        if response.status_code == 200:
-            result = response.json()
+        if response.status_code == 200 and isinstance(payload, dict):
             print("✅ Task created successfully!")
-            print(f"Submission ID: {result.get('submission_id', 'N/A')}")
-            print(f"Message: {result.get('message', 'N/A')}")
-            return result
+            print(f"Submission ID: {payload.get('submission_id', 'N/A')}")
+            print(f"Message: {payload.get('message', 'N/A')}")
+            return payload
         else:
             print(f"❌ Task creation failed with status code: {response.status_code}")
-            try:
-                error_msg = response.json().get('message', 'Unknown error')
-                print(f"Error message: {error_msg}")
-            except:
+            if isinstance(payload, dict):
+                print(f"Error message: {payload.get('message', 'Unknown error')}")
+            else:
                 print(f"Response text: {response.text}")
             return None
             
@@ -138,6 +189,13 @@ def create_task(config, token):
         print(f"❌ Unexpected error: {e}")
         return None
 
+def apply_overrides(default_config, overrides):
+    """Merge non-empty override values into the defaults in one pass (no prompts)."""
+    config = {**default_config, **{k: v for k, v in overrides.items() if v}}
+    config['vcf_mode'] = config.get('vcf_mode', '').upper()
+    config['assembly'] = config.get('assembly', '').lower()
+    return config
+
 def get_task_config_from_user(default_config):
     """Get task configuration from user input."""
     config = {}
@@ -203,11 +261,17 @@ def get_task_config_from_user(default_config):
     
     return config
 
-def run_create_task_module(token_file_path=None, config_file_path=None):
-    """Run the task creation module."""
-    print("\n" + "="*60)
-    print("🔬 TASK CREATION MODULE")
-    print("="*60)
+def run_create_task_module(token_file_path=None, config_file_path=None, overrides_file_path=None):
+    """Run the task creation module.
+    
+    When overrides_file_path is given, its JSON values are merged over the
+    default configuration instead of prompting for each field.
+    """
+    log = OutputBuffer()
+    log("\n" + "="*60)
+    log("🔬 TASK CREATION MODULE")
+    log("="*60)
+    log.flush()
     
     # Get token
     if token_file_path:
@@ -248,21 +312,39 @@ def run_create_task_module(token_file_path=None, config_file_path=None):
             return None
     
     # Show current configuration
-    print("Current default configuration:")
-    print(json.dumps(default_config, indent=2))
-    print("-" * 40)
-    
-    # Ask user if they want to use defaults or customize
-    use_defaults = input("Use default configuration? (y/n): ").lower().strip()
+    log("Current default configuration:")
+    log(json_dumps(default_config, indent=True).decode())
+    log("-" * 40)
+    log.flush()
     
-    if use_defaults in ['y', 'yes']:
-        task_config = default_config.copy()
+    if overrides_file_path:
+        try:
+            overrides = read_config_from_file(overrides_file_path)
+            print(f"✅ Overrides loaded from: {overrides_file_path}")
+        except Exception as e:
+            print(f"❌ Error loading overrides: {e}")
+            return None
+        task_config = apply_overrides(default_config, overrides)
     else:
-        task_config = get_task_config_from_user(default_config)
+        # Ask user if they want to use defaults or customize
+        use_defaults = input("Use default configuration? (y/n): ").lower().strip()
+        
+        if use_defaults in ['y', 'yes']:
+            task_config = default_config.copy()
+        else:
+            task_config = get_task_config_from_user(default_config)
     
-    print("\n📋 Final task configuration:")
-    print(json.dumps(task_config, indent=2))
-    print("-" * 40)
+    log("\n📋 Final task configuration:")
+    log(json_dumps(task_config, indent=True).decode())
+    log("-" * 40)
+    log.flush()
+    
+    # Validate before asking, so a bad config is reported without a wasted prompt
+    errors = validate_task_config(task_config)
+    if errors:
+        report_config_errors(errors)
+        print("\n💥 Task creation failed. Please check the error messages above.")
+        return None
     
     # Ask user if they want to proceed
     response = input("Do you want to create this task? (y/n): ").lower().strip()
@@ -270,13 +352,14 @@ def run_create_task_module(token_file_path=None, config_file_path=None):
         print("Task creation cancelled.")
         return None
     
-    # Create the task
-    result = create_task(task_config, token)
+    # Create the task; the config was validated above
+    result = create_task(task_config, token, validate=False)
     
     if result:
-        print("\n🎉 Task created successfully!")
-        print("You can now use the submission_id to check the task status.")
-        print(f"Submission ID: {result.get('submission_id')}")
+        log("\n🎉 Task created successfully!")
+        log("You can now use the submission_id to check the task status.")
+        log(f"Submission ID: {result.get('submission_id')}")
+        log.flush()
         return result.get('submission_id')
     else:
         print("\n💥 Task creation failed. Please check the error messages above.")
@@ -285,4 +368,5 @@ def run_create_task_module(token_file_path=None, config_file_path=None):
 if __name__ == "__main__":
     token_file = sys.argv[1] if len(sys.argv) > 1 else None
     config_file = sys.argv[2] if len(sys.argv) > 2 else None
-    run_create_task_module(token_file, config_file) 
\ No newline at end of file
+    overrides_file = sys.argv[3] if len(sys.argv) > 3 else None
+    run_create_task_module(token_file, config_file, overrides_file) 
\ No newline at end of file
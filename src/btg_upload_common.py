@@ -0,0 +1,98 @@
+"""
+Virtual Geneticist API - Upload Helpers
+File validation and the interactive prompts shared by every upload module.
+"""
+
+import os
+import stat
+import sys
+
+from btg_http import prewarm, read_token_from_file
+
+# File types the API accepts; matched as suffixes so .vcf.gz needs no special case
+SUPPORTED_EXTENSIONS = ('.vcf', '.vcf.gz', '.pdf', '.txt')
+
+def validate_file(file_path):
+    """Validate that the file exists and has a supported extension; returns its size in bytes."""
+    # One stat is both the existence check and the size the upload reports
+    try:
+        file_size = os.stat(file_path).st_size
+    except OSError:
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    if not file_path.endswith(SUPPORTED_EXTENSIONS):
+        file_ext = os.path.splitext(file_path)[1]
+        raise ValueError(f"Unsupported file type: {file_ext}. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+    
+    return file_size
+
+def ensure_file(path, label):
+    """Exit with a message unless path is a regular file; one stat per file."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        print(f"❌ {label} not found: {path}")
+        sys.exit(1)
+    if not stat.S_ISREG(st.st_mode):
+        print(f"❌ {label} is not a regular file: {path}")
+        sys.exit(1)
+
+def prompt_upload_args(title, token_file_path=None, file_path=None, prefix=None):
+    """Print the module banner and prompt for whatever was not passed in.
+    
+    Returns (file_path, token, prefix), in the order the upload functions take
+    them, or None once the reason the upload cannot go ahead has been printed.
+    """
+    # Connect to the upload endpoint while the prompts below wait for input
+    prewarm()
+    
+    print("\n" + "="*60)
+    print(title)
+    print("="*60)
+    
+    # Get token
+    if token_file_path:
+        try:
+            token = read_token_from_file(token_file_path)
+            print(f"✅ Token loaded from: {token_file_path}")
+        except Exception as e:
+            print(f"❌ Error loading token: {e}")
+            return None
+    else:
+        token_file_path = input("Enter token file path: ").strip()
+        if not token_file_path:
+            print("❌ Token file path is required")
+            return None
+        try:
+            token = read_token_from_file(token_file_path)
+        except Exception as e:
+            print(f"❌ Error loading token: {e}")
+            return None
+    
+    # Get file path
+    if file_path:
+        print(f"📁 File path provided: {file_path}")
+    else:
+        file_path = input("Enter file path: ").strip()
+        if not file_path:
+            print("❌ File path is required")
+            return None
+    
+    # Get prefix
+    if prefix:
+        print(f"📂 Prefix provided: {prefix}")
+    else:
+        prefix = input("Enter prefix (optional, press Enter to skip): ").strip()
+        if not prefix:
+            prefix = None
+    
+    print(f"\n📁 File: {file_path}")
+    print(f"📂 Prefix: {prefix if prefix else 'None'}")
+    print("-" * 40)
+    
+    # Check if file path is still the default
+    if file_path == "path/to/sample.vcf.gz":
+        print("⚠️  Please update the file_path with your actual file path")
+        return None
+    
+    return file_path, token, prefix
@@ -1,155 +1,163 @@
 """
 Virtual Geneticist API - Upload Module (v1.0.0 style)
-Simple upload without timeouts or retry logic.
+Single-attempt upload without a request timeout; the shared session retries failed connections
+and the upload circuit breaker pauses uploads while the server fails.
 """
 
 import requests
 import os
 import sys
 
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from btg_http import UPLOAD_BREAKER, UPLOAD_READ_BUFFER, auth_headers, get_session, json_loads
+from btg_log import get_logger
+from btg_upload_common import prompt_upload_args, validate_file
+
+try:
+    import pycurl
+except ImportError:  # optional; large files are streamed through requests otherwise
+    pycurl = None
+
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 UPLOAD_URL = f"{BASE_URL}/upload"
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
+# Files larger than this are sent by libcurl when pycurl is installed
+PYCURL_MIN_SIZE = 500 * 1024 * 1024
 
-def validate_file(file_path):
-    """Validate that the file exists and has a supported extension."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    # Check file extension
-    supported_extensions = ['.vcf', '.vcf.gz', '.pdf', '.txt']
-    file_ext = os.path.splitext(file_path)[1]
+# Upload progress goes through a logger so batch workers and --verbose share one switch
+logger = get_logger("btg.upload")
+
+def upload_file_pycurl(file_path, token, prefix=None):
+    """Upload a file with libcurl reading and sending the body in C.
     
-    # Handle .vcf.gz files (double extension)
-    if file_ext == '.gz':
-        base_name = os.path.splitext(file_path)[0]
-        file_ext = os.path.splitext(base_name)[1] + file_ext
+    Returns (status_code, result): the parsed response on HTTP 200,
+    otherwise None. Raises pycurl.error on network failures.
+    """
+    from io import BytesIO
     
-    if file_ext not in supported_extensions:
-        raise ValueError(f"Unsupported file type: {file_ext}. Supported types: {', '.join(supported_extensions)}")
+    fields = []
+    if prefix:
+        fields.append(('prefix', prefix))
+    fields.append(('file', (
+        pycurl.FORM_FILE, file_path,
+        pycurl.FORM_FILENAME, os.path.basename(file_path),
+        pycurl.FORM_CONTENTTYPE, 'application/octet-stream'
+    )))
+    
+    body = BytesIO()
+    curl = pycurl.Curl()
+    try:
+        curl.setopt(pycurl.URL, UPLOAD_URL)
+        curl.setopt(pycurl.HTTPHEADER, [f"{k}: {v}" for k, v in auth_headers(token).items()])
+        curl.setopt(pycurl.HTTPPOST, fields)
+        curl.setopt(pycurl.WRITEDATA, body)
+        try:
+            # Verify TLS against the same CA bundle requests uses
+            import certifi
+            curl.setopt(pycurl.CAINFO, certifi.where())
+        except ImportError:
+            pass
+        curl.perform()
+        status_code = curl.getinfo(pycurl.RESPONSE_CODE)
+    finally:
+        curl.close()
+    
+    content = body.getvalue()
+    if status_code == 200:
+        return status_code, json_loads(content)
+    
+    logger.error(f"❌ Upload failed with status code: {status_code}")
+    try:
+        error_msg = json_loads(content).get('message', 'Unknown error')
+        logger.info(f"Error message: {error_msg}")
+    except Exception:
+        logger.info(f"Response text: {content.decode('utf-8', 'replace')}")
+    return status_code, None
 
 def upload_file(file_path, token, prefix=None):
-    """Upload a file using v1.0.0 style - simple, no timeouts, no retries."""
+    """Upload a file using v1.0.0 style - one attempt, no request timeout.
     
-    # Validate the file
-    validate_file(file_path)
+    The shared session retries failed connections, and UPLOAD_BREAKER skips
+    the upload while the server keeps failing.
+    """
     
-    # Get file size for info
-    file_size = os.path.getsize(file_path)
+    # Validate the file and get its size for info
+    file_size = validate_file(file_path)
     file_size_mb = file_size / (1024 * 1024)
     
-    # Prepare headers
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    # Prepare form fields; the prefix goes ahead of the file part
+    fields = {}
+    if prefix:
+        fields['prefix'] = prefix
     
-    # Prepare form data
-    files = {
-        'file': open(file_path, 'rb')
-    }
+    logger.info(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
+    logger.debug("🔄 Using v1.0.0 style - one attempt, no request timeout; failed connections are retried")
     
-    data = {}
-    if prefix:
-        data['prefix'] = prefix
+    if not UPLOAD_BREAKER.allow():
+        logger.error(f"❌ Upload skipped: the server failed repeatedly, next attempt in {UPLOAD_BREAKER.remaining():.0f}s")
+        return None
     
-    print(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
-    print("🔄 Using v1.0.0 style - no timeouts, no retries")
+    if pycurl is not None and file_size > PYCURL_MIN_SIZE:
+        try:
+            status_code, result = upload_file_pycurl(file_path, token, prefix)
+        except pycurl.error as e:
+            UPLOAD_BREAKER.record(False)
+            logger.error(f"❌ Network error: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Unexpected error: {e}")
+            return None
+        # Client errors (bad token, unsupported file) say nothing about server health
+        UPLOAD_BREAKER.record(status_code < 500)
+        if result is not None:
+            logger.info(f"✅ Upload successful!\nRemote path: {result.get('upload_path', 'N/A')}")
+        return result
     
     try:
-        # Simple request - NO TIMEOUTS SPECIFIED (like v1.0.0)
-        response = requests.post(UPLOAD_URL, headers=headers, files=files, data=data)
+        # The with block closes the file even if the request raises
+        with open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER) as f:
+            # Stream the multipart body from disk with a known Content-Length
+            fields['file'] = (os.path.basename(file_path), f, 'application/octet-stream')
+            encoder = MultipartEncoder(fields=fields)
+            headers = {**auth_headers(token), 'Content-Type': encoder.content_type}
+            
+            # Simple request - NO TIMEOUTS SPECIFIED (like v1.0.0)
+            response = get_session().post(UPLOAD_URL, headers=headers, data=encoder)
         
-        # Close the file
-        files['file'].close()
+        UPLOAD_BREAKER.record(response.status_code < 500)
         
         # Handle response
         if response.status_code == 200:
-            result = response.json()
-            print(f"✅ Upload successful!")
-            print(f"Remote path: {result.get('upload_path', 'N/A')}")
+            result = json_loads(response.content)
+            logger.info(f"✅ Upload successful!\nRemote path: {result.get('upload_path', 'N/A')}")
             return result
         else:
-            print(f"❌ Upload failed with status code: {response.status_code}")
+            logger.error(f"❌ Upload failed with status code: {response.status_code}")
             try:
-                error_msg = response.json().get('message', 'Unknown error')
-                print(f"Error message: {error_msg}")
+                error_msg = json_loads(response.content).get('message', 'Unknown error')
+                logger.info(f"Error message: {error_msg}")
             except:
-                print(f"Response text: {response.text}")
+                logger.info(f"Response text: {response.text}")
             return None
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
+        UPLOAD_BREAKER.record(False)
+        logger.error(f"❌ Network error: {e}")
         return None
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.error(f"❌ Unexpected error: {e}")
         return None
 
 def run_upload_module(token_file_path=None, file_path=None, prefix=None):
     """Run the v1.0.0 style file upload module."""
-    print("\n" + "="*60)
-    print("📤 FILE UPLOAD MODULE (v1.0.0 style)")
-    print("="*60)
-    
-    # Get token
-    if token_file_path:
-        try:
-            token = read_token_from_file(token_file_path)
-            print(f"✅ Token loaded from: {token_file_path}")
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    else:
-        token_file_path = input("Enter token file path: ").strip()
-        if not token_file_path:
-            print("❌ Token file path is required")
-            return
-        try:
-            token = read_token_from_file(token_file_path)
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    
-    # Get file path
-    if file_path:
-        print(f"📁 File path provided: {file_path}")
-    else:
-        file_path = input("Enter file path: ").strip()
-        if not file_path:
-            print("❌ File path is required")
-            return
-    
-    # Get prefix
-    if prefix:
-        print(f"📂 Prefix provided: {prefix}")
-    else:
-        prefix = input("Enter prefix (optional, press Enter to skip): ").strip()
-        if not prefix:
-            prefix = None
-    
-    print(f"\n📁 File: {file_path}")
-    print(f"📂 Prefix: {prefix if prefix else 'None'}")
-    print("-" * 40)
-    
-    # Check if file path is still the default
-    if file_path == "path/to/sample.vcf.gz":
-        print("⚠️  Please update the file_path with your actual file path")
+    args = prompt_upload_args("📤 FILE UPLOAD MODULE (v1.0.0 style)", token_file_path, file_path, prefix)
+    if args is None:
         return
     
     # Perform upload
-    result = upload_file(file_path, token, prefix)
+    result = upload_file(*args)
     
     if result:
         print("\n🎉 Upload completed successfully!")
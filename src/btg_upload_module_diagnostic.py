@@ -9,94 +9,109 @@ import sys
 import time
 import socket
 
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from btg_http import backoff_delay
+from btg_log import get_logger
+from btg_upload_common import prompt_upload_args, validate_file
+
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 UPLOAD_URL = f"{BASE_URL}/upload"
 HOST = "vg-api.btgenomics.com"
 PORT = 8082
 
+# Upload progress goes through the same logger as upload_file, so batch workers
+# and --verbose share one switch
+logger = get_logger("btg.upload")
+
+# Read the upload from disk in 1 MiB blocks rather than the default 8 KiB
+UPLOAD_READ_BUFFER = 1 << 20
+
+# One session for the HTTPS probe and the upload, so the POST reuses the probe's
+# TLS connection. No adapter retries: every failure is reported as it happens.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+
+# Resolved addresses, host -> (ip, expiry on the monotonic clock)
+DNS_TTL = 300
+_DNS_CACHE = {}
+
+def resolve(host, ttl=DNS_TTL):
+    """Resolve host to an IPv4 address, reusing the answer for ttl seconds."""
+    now = time.monotonic()
+    cached = _DNS_CACHE.get(host)
+    if cached and now < cached[1]:
+        return cached[0]
+    ip = socket.gethostbyname(host)
+    _DNS_CACHE[host] = (ip, now + ttl)
+    return ip
+
 def test_connectivity():
     """Test basic connectivity to the server."""
-    print("🔍 Testing connectivity to vg-api.btgenomics.com...")
+    logger.info("🔍 Testing connectivity to vg-api.btgenomics.com...")
     
     # Test DNS resolution
     try:
-        ip = socket.gethostbyname(HOST)
-        print(f"✅ DNS resolution: {HOST} -> {ip}")
+        ip = resolve(HOST)
+        logger.info(f"✅ DNS resolution: {HOST} -> {ip}")
     except socket.gaierror as e:
-        print(f"❌ DNS resolution failed: {e}")
+        logger.error(f"❌ DNS resolution failed: {e}")
         return False
     
     # Test TCP connection
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(10)
-        result = sock.connect_ex((HOST, PORT))
+        # Connect to the address just resolved rather than looking the host up again
+        result = sock.connect_ex((ip, PORT))
         sock.close()
         
         if result == 0:
-            print(f"✅ TCP connection to {HOST}:{PORT} successful")
+            logger.info(f"✅ TCP connection to {HOST}:{PORT} successful")
         else:
-            print(f"❌ TCP connection to {HOST}:{PORT} failed (error code: {result})")
+            logger.error(f"❌ TCP connection to {HOST}:{PORT} failed (error code: {result})")
             return False
     except Exception as e:
-        print(f"❌ TCP connection test failed: {e}")
+        logger.error(f"❌ TCP connection test failed: {e}")
         return False
     
     # Test HTTPS connection
     try:
-        print("🔍 Testing HTTPS connection...")
-        response = requests.get(f"https://{HOST}:{PORT}/api", timeout=30)
-        print(f"✅ HTTPS connection successful (status: {response.status_code})")
+        logger.info("🔍 Testing HTTPS connection...")
+        response = SESSION.get(f"https://{HOST}:{PORT}/api", timeout=30)
+        logger.info(f"✅ HTTPS connection successful (status: {response.status_code})")
         return True
     except requests.exceptions.ConnectTimeout:
-        print("❌ HTTPS connection timeout - server may be down or network issues")
+        logger.error("❌ HTTPS connection timeout - server may be down or network issues")
         return False
     except requests.exceptions.SSLError as e:
-        print(f"❌ SSL/TLS error: {e}")
+        logger.error(f"❌ SSL/TLS error: {e}")
         return False
     except requests.exceptions.RequestException as e:
-        print(f"❌ HTTPS connection failed: {e}")
+        logger.error(f"❌ HTTPS connection failed: {e}")
         return False
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
+# A passing connectivity test is trusted for this long before probing again
+CONNECTIVITY_OK_TTL = 60
+_last_ok = 0.0
 
-def validate_file(file_path):
-    """Validate that the file exists and has a supported extension."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    # Check file extension
-    supported_extensions = ['.vcf', '.vcf.gz', '.pdf', '.txt']
-    file_ext = os.path.splitext(file_path)[1]
-    
-    # Handle .vcf.gz files (double extension)
-    if file_ext == '.gz':
-        base_name = os.path.splitext(file_path)[0]
-        file_ext = os.path.splitext(base_name)[1] + file_ext
-    
-    if file_ext not in supported_extensions:
-        raise ValueError(f"Unsupported file type: {file_ext}. Supported types: {', '.join(supported_extensions)}")
+def ensure_connectivity():
+    """Run test_connectivity unless it passed within the last CONNECTIVITY_OK_TTL seconds."""
+    global _last_ok
+    if time.monotonic() - _last_ok < CONNECTIVITY_OK_TTL:
+        return True
+    if not test_connectivity():
+        return False
+    _last_ok = time.monotonic()
+    return True
 
-def upload_file_diagnostic(file_path, token, prefix=None, max_retries=1):
+def upload_file_diagnostic(file_path, token, prefix=None, max_retries=3):
     """Upload a file with diagnostic information."""
     
-    # Validate the file
-    validate_file(file_path)
-    
-    # Get file size for info
-    file_size = os.path.getsize(file_path)
+    # Validate the file and get its size for info
+    file_size = validate_file(file_path)
     file_size_mb = file_size / (1024 * 1024)
     
     # Prepare headers
@@ -109,123 +124,93 @@ def upload_file_diagnostic(file_path, token, prefix=None, max_retries=1):
     if prefix:
         data['prefix'] = prefix
     
-    print(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
-    print(f"📊 File size: {file_size:,} bytes")
-    print(f"🌐 Upload URL: {UPLOAD_URL}")
+    # Use 5-minute timeout for diagnostic purposes
+    timeout = (300, 300)  # 5min connect, 5min read
     
-    for attempt in range(max_retries):
-        try:
-            print(f"🔄 Attempt {attempt + 1}/{max_retries} - Starting upload...")
-            
-            # Test connectivity first
-            if not test_connectivity():
-                print("❌ Connectivity test failed. Cannot proceed with upload.")
-                return None
-            
-            # Simple upload with very short timeout for testing
-            files = {
-                'file': open(file_path, 'rb')
-            }
-            
-            # Use 5-minute timeout for diagnostic purposes
-            timeout = (300, 300)  # 5min connect, 5min read
-            
-            print(f"⏱️  Using timeout: {timeout[0]}s connect, {timeout[1]}s read")
-            print("📤 Sending upload request...")
-            
-            response = requests.post(
-                UPLOAD_URL, 
-                headers=headers, 
-                files=files, 
-                data=data,
-                timeout=timeout
-            )
-            
-            files['file'].close()
-            
-            # Handle response
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Upload successful!")
-                print(f"Remote path: {result.get('upload_path', 'N/A')}")
-                return result
-            else:
-                print(f"❌ Upload failed with status code: {response.status_code}")
+    logger.info(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
+    logger.info(f"📊 File size: {file_size:,} bytes")
+    logger.info(f"🌐 Upload URL: {UPLOAD_URL}")
+    
+    # Test connectivity once up front rather than before every attempt
+    if not ensure_connectivity():
+        logger.error("❌ Connectivity test failed. Cannot proceed with upload.")
+        return None
+    
+    try:
+        f = open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER)
+    except OSError as e:
+        logger.error(f"❌ Cannot open file: {e}")
+        return None
+    
+    # One handle serves every attempt and is rewound before each; the with block
+    # closes it however the loop exits
+    with f:
+        for attempt in range(max_retries):
+            # Recoverable failures (timeouts, dropped connections, 5xx) fall
+            # through to the backoff below; anything else returns
+            try:
+                logger.info(f"🔄 Attempt {attempt + 1}/{max_retries} - Starting upload...")
+                logger.info(f"⏱️  Using timeout: {timeout[0]}s connect, {timeout[1]}s read")
+                logger.info("📤 Sending upload request...")
+                
+                # Stream the multipart body from disk
+                f.seek(0)
+                encoder = MultipartEncoder(fields={**data, 'file': (os.path.basename(file_path), f, 'application/octet-stream')})
+                response = SESSION.post(
+                    UPLOAD_URL, 
+                    headers={**headers, 'Content-Type': encoder.content_type}, 
+                    data=encoder,
+                    timeout=timeout
+                )
+                
+                # Handle response
+                if response.status_code == 200:
+                    result = response.json()
+                    logger.info(f"✅ Upload successful!\nRemote path: {result.get('upload_path', 'N/A')}")
+                    return result
+                
+                logger.error(f"❌ Upload failed with status code: {response.status_code}")
                 try:
                     error_msg = response.json().get('message', 'Unknown error')
-                    print(f"Error message: {error_msg}")
+                    logger.info(f"Error message: {error_msg}")
                 except:
-                    print(f"Response text: {response.text}")
-                return None
+                    logger.info(f"Response text: {response.text}")
+                
+                # Client errors (4xx) will not succeed on retry
+                if response.status_code < 500:
+                    return None
                     
-        except requests.exceptions.Timeout as e:
-            print(f"❌ Timeout error (attempt {attempt + 1}/{max_retries}): {e}")
-            print("💡 This suggests network connectivity issues or server overload.")
-            return None
+            except requests.exceptions.Timeout as e:
+                logger.error(f"❌ Timeout error (attempt {attempt + 1}/{max_retries}): {e}")
+                logger.info("💡 This suggests network connectivity issues or server overload.")
                 
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Network error (attempt {attempt + 1}/{max_retries}): {e}")
-            return None
+            except requests.exceptions.ConnectionError as e:
+                logger.error(f"❌ Connection error (attempt {attempt + 1}/{max_retries}): {e}")
+                
+            except requests.exceptions.RequestException as e:
+                logger.error(f"❌ Network error (attempt {attempt + 1}/{max_retries}): {e}")
+                return None
                 
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return None
+            except Exception as e:
+                logger.error(f"❌ Unexpected error: {e}")
+                return None
+            
+            if attempt < max_retries - 1:
+                wait_time = backoff_delay(attempt)
+                logger.info(f"⏳ Waiting {wait_time:.1f} seconds before retry...")
+                time.sleep(wait_time)
     
+    logger.error("❌ Max retries exceeded. Upload failed.")
     return None
 
 def run_upload_module_diagnostic(token_file_path=None, file_path=None, prefix=None):
     """Run the diagnostic file upload module."""
-    print("\n" + "="*60)
-    print("📤 DIAGNOSTIC FILE UPLOAD MODULE")
-    print("="*60)
-    
-    # Get token
-    if token_file_path:
-        try:
-            token = read_token_from_file(token_file_path)
-            print(f"✅ Token loaded from: {token_file_path}")
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    else:
-        token_file_path = input("Enter token file path: ").strip()
-        if not token_file_path:
-            print("❌ Token file path is required")
-            return
-        try:
-            token = read_token_from_file(token_file_path)
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    
-    # Get file path
-    if file_path:
-        print(f"📁 File path provided: {file_path}")
-    else:
-        file_path = input("Enter file path: ").strip()
-        if not file_path:
-            print("❌ File path is required")
-            return
-    
-    # Get prefix
-    if prefix:
-        print(f"📂 Prefix provided: {prefix}")
-    else:
-        prefix = input("Enter prefix (optional, press Enter to skip): ").strip()
-        if not prefix:
-            prefix = None
-    
-    print(f"\n📁 File: {file_path}")
-    print(f"📂 Prefix: {prefix if prefix else 'None'}")
-    print("-" * 40)
-    
-    # Check if file path is still the default
-    if file_path == "path/to/sample.vcf.gz":
-        print("⚠️  Please update the file_path with your actual file path")
+    args = prompt_upload_args("📤 DIAGNOSTIC FILE UPLOAD MODULE", token_file_path, file_path, prefix)
+    if args is None:
         return
     
     # Perform upload
-    result = upload_file_diagnostic(file_path, token, prefix)
+    result = upload_file_diagnostic(*args)
     
     if result:
         print("\n🎉 Upload completed successfully!")
@@ -7,183 +7,158 @@ import requests
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from btg_http import UPLOAD_BREAKER, UPLOAD_READ_BUFFER, auth_headers, backoff_delay, get_session, json_loads, retries_exhausted
+from btg_log import get_logger, queued_logging
+from btg_upload_common import prompt_upload_args, validate_file
 
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 UPLOAD_URL = f"{BASE_URL}/upload"
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
-
-def validate_file(file_path):
-    """Validate that the file exists and has a supported extension."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    # Check file extension
-    supported_extensions = ['.vcf', '.vcf.gz', '.pdf', '.txt']
-    file_ext = os.path.splitext(file_path)[1]
-    
-    # Handle .vcf.gz files (double extension)
-    if file_ext == '.gz':
-        base_name = os.path.splitext(file_path)[0]
-        file_ext = os.path.splitext(base_name)[1] + file_ext
-    
-    if file_ext not in supported_extensions:
-        raise ValueError(f"Unsupported file type: {file_ext}. Supported types: {', '.join(supported_extensions)}")
+# Upload progress goes through the same logger as upload_file, so batch workers
+# and --verbose share one switch
+logger = get_logger("btg.upload")
 
 def upload_file_simple(file_path, token, prefix=None, max_retries=3):
     """Upload a file to the Virtual Geneticist API without progress bar."""
     
-    # Validate the file
-    validate_file(file_path)
-    
-    # Get file size for info
-    file_size = os.path.getsize(file_path)
+    # Validate the file and get its size for info
+    file_size = validate_file(file_path)
     file_size_mb = file_size / (1024 * 1024)
     
     # Prepare headers
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    headers = auth_headers(token)
     
     # Prepare form data
     data = {}
     if prefix:
         data['prefix'] = prefix
     
-    print(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
+    logger.info(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
     
-    for attempt in range(max_retries):
-        try:
-            # Simple upload without progress tracking
-            files = {
-                'file': open(file_path, 'rb')
-            }
-            
-            # Use longer timeout for large files
-            if file_size > 100 * 1024 * 1024:  # 100MB
-                timeout = (30, 600)  # 30s connect, 10min read
-            else:
-                timeout = (30, 300)  # 30s connect, 5min read
-            
-            response = requests.post(
-                UPLOAD_URL, 
-                headers=headers, 
-                files=files, 
-                data=data,
-                timeout=timeout
-            )
-            
-            files['file'].close()
+    # Use longer timeout for large files
+    if file_size > 100 * 1024 * 1024:  # 100MB
+        timeout = (30, 600)  # 30s connect, 10min read
+    else:
+        timeout = (30, 300)  # 30s connect, 5min read
+    
+    try:
+        f = open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER)
+    except OSError as e:
+        logger.error(f"❌ Cannot open file: {e}")
+        return None
+    
+    # One handle serves every attempt and is rewound before each; the with block
+    # closes it however the loop exits
+    with f:
+        # Connection failures are already retried by the session (UPLOAD_RETRY_OPTIONS);
+        # this loop only adds attempts for timeouts and 5xx responses the session does not replay
+        for attempt in range(max_retries):
+            if not UPLOAD_BREAKER.allow():
+                logger.error(f"❌ Upload skipped: the server failed repeatedly, next attempt in {UPLOAD_BREAKER.remaining():.0f}s")
+                return None
             
-            # Handle response
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Upload successful!")
-                print(f"Remote path: {result.get('upload_path', 'N/A')}")
-                return result
-            else:
-                print(f"❌ Upload failed with status code: {response.status_code}")
-                try:
-                    error_msg = response.json().get('message', 'Unknown error')
-                    print(f"Error message: {error_msg}")
-                except:
-                    print(f"Response text: {response.text}")
+            try:
+                # Simple upload without progress tracking; the body is streamed from disk
+                f.seek(0)
+                encoder = MultipartEncoder(fields={**data, 'file': (os.path.basename(file_path), f, 'application/octet-stream')})
+                response = get_session().post(
+                    UPLOAD_URL, 
+                    headers={**headers, 'Content-Type': encoder.content_type}, 
+                    data=encoder,
+                    timeout=timeout
+                )
+                
+                UPLOAD_BREAKER.record(response.status_code < 500)
                 
-                # Don't retry on client errors (4xx)
-                if 400 <= response.status_code < 500:
+                # Handle response
+                if response.status_code == 200:
+                    result = json_loads(response.content)
+                    logger.info(f"✅ Upload successful!\nRemote path: {result.get('upload_path', 'N/A')}")
+                    return result
+                else:
+                    logger.error(f"❌ Upload failed with status code: {response.status_code}")
+                    try:
+                        error_msg = json_loads(response.content).get('message', 'Unknown error')
+                        logger.info(f"Error message: {error_msg}")
+                    except:
+                        logger.info(f"Response text: {response.text}")
+                    
+                    # Don't retry on client errors (4xx)
+                    if 400 <= response.status_code < 500:
+                        return None
+                    
+                    # Server errors are retried after the same backoff as network errors
+                    if attempt < max_retries - 1:
+                        wait_time = backoff_delay(attempt)
+                        logger.info(f"⏳ Waiting {wait_time:.1f} seconds before retry...")
+                        time.sleep(wait_time)
+                        
+            except requests.exceptions.Timeout as e:
+                UPLOAD_BREAKER.record(False)
+                logger.error(f"❌ Timeout error (attempt {attempt + 1}/{max_retries}): {e}")
+                if attempt < max_retries - 1 and not retries_exhausted(e):
+                    wait_time = backoff_delay(attempt)
+                    logger.info(f"⏳ Waiting {wait_time:.1f} seconds before retry...")
+                    time.sleep(wait_time)
+                else:
+                    logger.error("❌ Max retries exceeded. Upload failed.")
                     return None
                     
-        except requests.exceptions.Timeout as e:
-            print(f"❌ Timeout error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⏳ Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                print("❌ Max retries exceeded. Upload failed.")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Network error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⏳ Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                print("❌ Max retries exceeded. Upload failed.")
+            except requests.exceptions.RequestException as e:
+                UPLOAD_BREAKER.record(False)
+                logger.error(f"❌ Network error (attempt {attempt + 1}/{max_retries}): {e}")
+                if attempt < max_retries - 1 and not retries_exhausted(e):
+                    wait_time = backoff_delay(attempt)
+                    logger.info(f"⏳ Waiting {wait_time:.1f} seconds before retry...")
+                    time.sleep(wait_time)
+                else:
+                    logger.error("❌ Max retries exceeded. Upload failed.")
+                    return None
+                    
+            except Exception as e:
+                logger.error(f"❌ Unexpected error: {e}")
                 return None
-                
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return None
-    
+        
     return None
 
-def run_upload_module_simple(token_file_path=None, file_path=None, prefix=None):
-    """Run the simple file upload module without progress bar."""
-    print("\n" + "="*60)
-    print("📤 SIMPLE FILE UPLOAD MODULE (No Progress Bar)")
-    print("="*60)
-    
-    # Get token
-    if token_file_path:
-        try:
-            token = read_token_from_file(token_file_path)
-            print(f"✅ Token loaded from: {token_file_path}")
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    else:
-        token_file_path = input("Enter token file path: ").strip()
-        if not token_file_path:
-            print("❌ Token file path is required")
-            return
-        try:
-            token = read_token_from_file(token_file_path)
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
+def upload_files(file_paths, token, prefix=None, max_parallel=4):
+    """Upload several files at once over the shared session.
     
-    # Get file path
-    if file_path:
-        print(f"📁 File path provided: {file_path}")
-    else:
-        file_path = input("Enter file path: ").strip()
-        if not file_path:
-            print("❌ File path is required")
-            return
+    Returns a dict mapping each path to its upload result, or None for
+    files that failed.
+    """
+    file_paths = list(file_paths)
     
-    # Get prefix
-    if prefix:
-        print(f"📂 Prefix provided: {prefix}")
-    else:
-        prefix = input("Enter prefix (optional, press Enter to skip): ").strip()
-        if not prefix:
-            prefix = None
+    def upload_one(file_path):
+        # A missing or unsupported file fails on its own instead of aborting the rest
+        try:
+            return upload_file_simple(file_path, token, prefix)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"❌ {e}")
+            return None
     
-    print(f"\n📁 File: {file_path}")
-    print(f"📂 Prefix: {prefix if prefix else 'None'}")
-    print("-" * 40)
+    # The shared session's pool is larger than any sensible max_parallel; one
+    # writer thread prints for all workers
+    with queued_logging(logger), ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        results = dict(zip(file_paths, executor.map(upload_one, file_paths)))
     
-    # Check if file path is still the default
-    if file_path == "path/to/sample.vcf.gz":
-        print("⚠️  Please update the file_path with your actual file path")
+    uploaded = sum(1 for result in results.values() if result)
+    logger.info(f"📦 Uploaded {uploaded}/{len(results)} files")
+    return results
+
+def run_upload_module_simple(token_file_path=None, file_path=None, prefix=None):
+    """Run the simple file upload module without progress bar."""
+    args = prompt_upload_args("📤 SIMPLE FILE UPLOAD MODULE (No Progress Bar)", token_file_path, file_path, prefix)
+    if args is None:
         return
     
     # Perform upload
-    result = upload_file_simple(file_path, token, prefix)
+    result = upload_file_simple(*args)
     
     if result:
         print("\n🎉 Upload completed successfully!")
@@ -1,155 +1,94 @@
 """
 Virtual Geneticist API - v1.0.0 Style Upload Module
-Simple upload without timeouts or retry logic (like the original working version).
+Single-attempt upload without a request timeout (like the original working version); the shared
+session retries failed connections and the upload circuit breaker pauses uploads while the server fails.
 """
 
 import requests
 import os
 import sys
 
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from btg_http import UPLOAD_BREAKER, UPLOAD_READ_BUFFER, auth_headers, get_session, json_loads
+from btg_log import get_logger
+from btg_upload_common import prompt_upload_args, validate_file
+
 # === CONFIGURATION ===
 BASE_URL = "https://vg-api.btgenomics.com:8082/api"
 UPLOAD_URL = f"{BASE_URL}/upload"
 
-def read_token_from_file(token_file_path):
-    """Read token from a text file."""
-    try:
-        with open(token_file_path, 'r') as f:
-            token = f.read().strip()
-        if not token:
-            raise ValueError("Token file is empty")
-        return token
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Token file not found: {token_file_path}")
-    except Exception as e:
-        raise Exception(f"Error reading token file: {e}")
-
-def validate_file(file_path):
-    """Validate that the file exists and has a supported extension."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    # Check file extension
-    supported_extensions = ['.vcf', '.vcf.gz', '.pdf', '.txt']
-    file_ext = os.path.splitext(file_path)[1]
-    
-    # Handle .vcf.gz files (double extension)
-    if file_ext == '.gz':
-        base_name = os.path.splitext(file_path)[0]
-        file_ext = os.path.splitext(base_name)[1] + file_ext
-    
-    if file_ext not in supported_extensions:
-        raise ValueError(f"Unsupported file type: {file_ext}. Supported types: {', '.join(supported_extensions)}")
+# Upload progress goes through the same logger as upload_file, so batch workers
+# and --verbose share one switch
+logger = get_logger("btg.upload")
 
 def upload_file_v1(file_path, token, prefix=None):
-    """Upload a file using v1.0.0 style - simple, no timeouts, no retries."""
+    """Upload a file using v1.0.0 style - one attempt, no request timeout.
     
-    # Validate the file
-    validate_file(file_path)
+    The shared session retries failed connections, and UPLOAD_BREAKER skips
+    the upload while the server keeps failing.
+    """
     
-    # Get file size for info
-    file_size = os.path.getsize(file_path)
+    # Validate the file and get its size for info
+    file_size = validate_file(file_path)
     file_size_mb = file_size / (1024 * 1024)
     
     # Prepare headers
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    headers = auth_headers(token)
     
     # Prepare form data
-    files = {
-        'file': open(file_path, 'rb')
-    }
-    
     data = {}
     if prefix:
         data['prefix'] = prefix
     
-    print(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
-    print("🔄 Using v1.0.0 style - no timeouts, no retries")
+    logger.info(f"📤 Uploading {os.path.basename(file_path)} ({file_size_mb:.1f}MB)...")
+    logger.debug("🔄 Using v1.0.0 style - one attempt, no request timeout; failed connections are retried")
+    
+    if not UPLOAD_BREAKER.allow():
+        logger.error(f"❌ Upload skipped: the server failed repeatedly, next attempt in {UPLOAD_BREAKER.remaining():.0f}s")
+        return None
     
     try:
-        # Simple request - NO TIMEOUTS SPECIFIED (like v1.0.0)
-        response = requests.post(UPLOAD_URL, headers=headers, files=files, data=data)
+        # The with block closes the file even if the request raises
+        with open(file_path, 'rb', buffering=UPLOAD_READ_BUFFER) as f:
+            # Stream the multipart body from disk with a known Content-Length
+            encoder = MultipartEncoder(fields={**data, 'file': (os.path.basename(file_path), f, 'application/octet-stream')})
+            
+            # Simple request - NO TIMEOUTS SPECIFIED (like v1.0.0)
+            response = get_session().post(UPLOAD_URL, headers={**headers, 'Content-Type': encoder.content_type}, data=encoder)
         
-        # Close the file
-        files['file'].close()
+        UPLOAD_BREAKER.record(response.status_code < 500)
         
         # Handle response
         if response.status_code == 200:
-            result = response.json()
-            print(f"✅ Upload successful!")
-            print(f"Remote path: {result.get('upload_path', 'N/A')}")
+            result = json_loads(response.content)
+            logger.info(f"✅ Upload successful!\nRemote path: {result.get('upload_path', 'N/A')}")
             return result
         else:
-            print(f"❌ Upload failed with status code: {response.status_code}")
+            logger.error(f"❌ Upload failed with status code: {response.status_code}")
             try:
-                error_msg = response.json().get('message', 'Unknown error')
-                print(f"Error message: {error_msg}")
+                error_msg = json_loads(response.content).get('message', 'Unknown error')
+                logger.info(f"Error message: {error_msg}")
             except:
-                print(f"Response text: {response.text}")
+                logger.info(f"Response text: {response.text}")
             return None
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
+        UPLOAD_BREAKER.record(False)
+        logger.error(f"❌ Network error: {e}")
         return None
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.error(f"❌ Unexpected error: {e}")
         return None
 
 def run_upload_module_v1(token_file_path=None, file_path=None, prefix=None):
     """Run the v1.0.0 style file upload module."""
-    print("\n" + "="*60)
-    print("📤 V1.0.0 STYLE FILE UPLOAD MODULE")
-    print("="*60)
-    
-    # Get token
-    if token_file_path:
-        try:
-            token = read_token_from_file(token_file_path)
-            print(f"✅ Token loaded from: {token_file_path}")
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    else:
-        token_file_path = input("Enter token file path: ").strip()
-        if not token_file_path:
-            print("❌ Token file path is required")
-            return
-        try:
-            token = read_token_from_file(token_file_path)
-        except Exception as e:
-            print(f"❌ Error loading token: {e}")
-            return
-    
-    # Get file path
-    if file_path:
-        print(f"📁 File path provided: {file_path}")
-    else:
-        file_path = input("Enter file path: ").strip()
-        if not file_path:
-            print("❌ File path is required")
-            return
-    
-    # Get prefix
-    if prefix:
-        print(f"📂 Prefix provided: {prefix}")
-    else:
-        prefix = input("Enter prefix (optional, press Enter to skip): ").strip()
-        if not prefix:
-            prefix = None
-    
-    print(f"\n📁 File: {file_path}")
-    print(f"📂 Prefix: {prefix if prefix else 'None'}")
-    print("-" * 40)
-    
-    # Check if file path is still the default
-    if file_path == "path/to/sample.vcf.gz":
-        print("⚠️  Please update the file_path with your actual file path")
+    args = prompt_upload_args("📤 V1.0.0 STYLE FILE UPLOAD MODULE", token_file_path, file_path, prefix)
+    if args is None:
         return
     
     # Perform upload
-    result = upload_file_v1(file_path, token, prefix)
+    result = upload_file_v1(*args)
     
     if result:
         print("\n🎉 Upload completed successfully!")